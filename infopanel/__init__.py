@@ -1,3 +1,2 @@
-from .config import load_config
-
-load_config()
+# Imported first, so the startup timer tells the interpreter's startup apart from importing the modules
+from .startup import STARTUP as STARTUP
@@ -1,21 +1,60 @@
 import logging
 
-from .config import CONFIG
+from .compositor import Compositor
+from .config import CONFIG, ConfigWatcher, load_config
 from .ledpanel import LEDPanel
+from .metrics import MetricsService
 from .scheduler import Scheduler
+from .startup import STARTUP
 
 
 def main():
     logging.basicConfig(level=logging.INFO)
+    STARTUP.mark("imports")
+
+    load_config()
+    STARTUP.mark("config")
 
     panel = LEDPanel(CONFIG.get("ledpanel", {}))
     panel.initialize()
+    STARTUP.mark("panel")
+
+    # A canvas split into regions runs a widget rotation per region, otherwise the scheduler drives the whole panel
+    scheduler: Scheduler | Compositor
+    if "regions" in CONFIG:
+        scheduler = Compositor(regions=CONFIG["regions"], panel=panel)
+    else:
+        scheduler = Scheduler(
+            config=CONFIG.get("scheduler", {}),
+            panel=panel,
+        )
+    STARTUP.mark("widgets")
+
+    def on_config_change(config: dict):
+        if config.get("ledpanel", {}) != CONFIG.get("ledpanel", {}):
+            logging.getLogger("infopanel").warning("Panel settings changed, restart to apply them")
+        if ("regions" in config) != isinstance(scheduler, Compositor):
+            logging.getLogger("infopanel").warning("Switching between regions and a single scheduler needs a restart")
+            return
+        CONFIG.clear()
+        CONFIG.update(config)
+        if isinstance(scheduler, Compositor):
+            scheduler.reconfigure(config["regions"])
+        else:
+            scheduler.reconfigure(config.get("scheduler", {}))
+
+    # Widget changes in the config file are applied without a restart
+    watcher = ConfigWatcher(on_config_change, interval=CONFIG.get("reload_interval", 2))
 
-    scheduler = Scheduler(
-        config=CONFIG.get("scheduler", {}),
-        panel=panel,
-    )
-    scheduler.run()
+    metrics = MetricsService(CONFIG.get("metrics", {}), profiler=scheduler.profiler)
+    metrics.start()
+    watcher.start()
+    try:
+        scheduler.run()
+    finally:
+        watcher.stop()
+        metrics.stop()
+        panel.close()
 
 
 if __name__ == "__main__":
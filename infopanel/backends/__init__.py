@@ -0,0 +1,21 @@
+from importlib import import_module
+
+from .base import Backend as Backend
+from .base import Rect as Rect
+
+# Backends are imported on first use, so only the selected backend's libraries (rgbmatrix, the emulator) are loaded
+BACKENDS = {
+    "canvas": "canvas:CanvasBackend",
+    "capture": "capture:CaptureBackend",
+    "framebuffer": "framebuffer:FramebufferBackend",
+    "headless": "headless:HeadlessBackend",
+}
+
+
+def get_backend_class(name: str) -> type[Backend] | None:
+    if name not in BACKENDS:
+        return None
+
+    module_name, class_name = BACKENDS[name].split(":")
+    module = import_module(f".{module_name}", __name__)
+    return getattr(module, class_name)
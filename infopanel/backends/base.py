@@ -0,0 +1,79 @@
+from abc import ABC, abstractmethod
+
+from ..font import Font
+
+# x, y, width, height
+Rect = tuple[int, int, int, int]
+
+
+class Backend(ABC):
+    # Backends that can prerender text into sprites get their text through the panel's sprite cache
+    supports_sprites = False
+
+    # Backends with a spare surface can render a frame off-screen and present it later
+    supports_offscreen = False
+
+    # Backends that render into a numpy frame can show composited frames, e.g. for transitions
+    supports_compositing = False
+
+    def __init__(self, config: dict):
+        self._config = config
+
+    # Chained panels extend the canvas to the right, parallel chains extend it downwards
+    @property
+    def width(self) -> int:
+        return self._config["cols"] * self._config.get("chain_length", 1)
+
+    @property
+    def height(self) -> int:
+        return self._config["rows"] * self._config.get("parallel", 1)
+
+    @abstractmethod
+    def initialize(self):
+        raise NotImplementedError("Subclasses must implement initialize() method")
+
+    def close(self):  # noqa: B027
+        # Releases what initialize() acquired, most backends hold nothing that outlives the process
+        pass
+
+    @abstractmethod
+    def swap(self, damage: list[Rect] | None = None):
+        # damage lists the regions that changed since the last swap, None means the whole frame
+        raise NotImplementedError("Subclasses must implement swap() method")
+
+    @abstractmethod
+    def clear(self):
+        raise NotImplementedError("Subclasses must implement clear() method")
+
+    @abstractmethod
+    def clear_rect(self, rect: Rect):
+        # Clears a region that is already clipped to the panel
+        raise NotImplementedError("Subclasses must implement clear_rect() method")
+
+    @abstractmethod
+    def draw_text(self, font: Font, x: int, y: int, color: tuple[int, int, int], text: str):
+        # Draws text with its baseline at y, the text is already truncated and aligned
+        raise NotImplementedError("Subclasses must implement draw_text() method")
+
+    def create_sprite(self, font: Font, color: tuple[int, int, int], text: str, gap: int | None = None) -> object:
+        # With a gap, the sprite holds the text twice, gap pixels apart, for marquees to cut their window from
+        raise NotImplementedError(f"{self.__class__.__name__} does not support sprites")
+
+    def draw_sprite(self, sprite: object, x: int, y: int, window: tuple[int, int] | None = None):
+        # Draws a sprite created by create_sprite() with its baseline at y, optionally only the columns of window (start, width)
+        raise NotImplementedError(f"{self.__class__.__name__} does not support sprites")
+
+    def begin_offscreen(self):
+        # Redirects all drawing to the spare surface, until end_offscreen() is called
+        raise NotImplementedError(f"{self.__class__.__name__} does not support off-screen rendering")
+
+    def end_offscreen(self):
+        raise NotImplementedError(f"{self.__class__.__name__} does not support off-screen rendering")
+
+    def present_offscreen(self):
+        # Makes the spare surface the current one, the next swap() has to show all of it
+        raise NotImplementedError(f"{self.__class__.__name__} does not support off-screen rendering")
+
+    def swap_image(self, image):
+        # Shows image (an RGB array the size of the panel) instead of the current frame
+        raise NotImplementedError(f"{self.__class__.__name__} does not support compositing")
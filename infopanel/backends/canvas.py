@@ -0,0 +1,83 @@
+from typing import TYPE_CHECKING
+
+from ..font import Font
+from .base import Backend, Rect
+from .matrix import create_matrix, load_matrix_library
+
+if TYPE_CHECKING:
+    from RGBMatrixEmulator import graphics
+
+    from .matrix import Canvas, RGBMatrix
+
+
+class CanvasBackend(Backend):
+    supports_offscreen = True
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+
+        self._matrix: RGBMatrix | None = None
+        self._canvas: Canvas | None = None
+        self._spare_canvas: Canvas | None = None
+
+        self._graphics = None
+        self._fonts: dict[str, graphics.Font] = {}
+
+    @property
+    def graphics(self):
+        if self._graphics is None:
+            raise RuntimeError("LEDPanel not initialized. Call initialize() first.")
+        return self._graphics
+
+    def _get_font(self, font: Font) -> graphics.Font:
+        # The matrix library's own font is only needed for drawing, so load it on first use
+        if font.name not in self._fonts:
+            font_obj = self.graphics.Font()
+            font_obj.LoadFont(font.path.as_posix())
+            self._fonts[font.name] = font_obj
+
+        return self._fonts[font.name]
+
+    @property
+    def matrix(self) -> RGBMatrix:
+        if self._matrix is None:
+            raise RuntimeError("LEDPanel not initialized. Call initialize() first.")
+        return self._matrix
+
+    @property
+    def canvas(self) -> Canvas:
+        if self._canvas is None:
+            raise RuntimeError("LEDPanel not initialized. Call initialize() first.")
+        return self._canvas
+
+    def initialize(self):
+        self._matrix, self._canvas = create_matrix(self._config)
+        self._graphics = load_matrix_library(self._config.get("emulator", False)).graphics
+
+    def swap(self, damage: list[Rect] | None = None):
+        self.matrix.SwapOnVSync(self._canvas)
+
+    def clear(self):
+        self.canvas.Clear()
+
+    def clear_rect(self, rect: Rect):
+        x, y, width, height = rect
+        graphics = self.graphics
+        black = graphics.Color(0, 0, 0)
+        for row in range(y, y + height):
+            graphics.DrawLine(self.canvas, x, row, x + width - 1, row, black)
+
+    def draw_text(self, font: Font, x: int, y: int, color: tuple[int, int, int], text: str):
+        self.graphics.DrawText(self.canvas, self._get_font(font), x, y, self.graphics.Color(*color), text)
+
+    def begin_offscreen(self):
+        if self._spare_canvas is None:
+            self._spare_canvas = self.matrix.CreateFrameCanvas()
+        self._canvas, self._spare_canvas = self._spare_canvas, self._canvas
+
+    def end_offscreen(self):
+        self._canvas, self._spare_canvas = self._spare_canvas, self._canvas
+
+    def present_offscreen(self):
+        # swap() hands the spare canvas to SwapOnVSync, which puts it on the panel
+        self._canvas, self._spare_canvas = self._spare_canvas, self._canvas
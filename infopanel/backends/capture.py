@@ -0,0 +1,128 @@
+import mmap
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from .base import Rect
+from .headless import HeadlessBackend
+
+# Capture files are a header followed by raw frames of height x width x 3 bytes (RGB), back to back.
+# The header holds magic, version, width, height and the number of frames written so far.
+CAPTURE_MAGIC = b"IPFC"
+CAPTURE_VERSION = 1
+CAPTURE_HEADER = struct.Struct("<4sHHHxxI")
+
+
+class CaptureWriter:
+    # Appends frames to a capture file through a memory map, which grows by doubling. The header is updated
+    # with every frame, so a capture can be read while it is still being written (or after a crash).
+
+    def __init__(self, path: str | Path, width: int, height: int, capacity: int = 1024):
+        self._width = width
+        self._height = height
+        self._frame_size = width * height * 3
+        self._count = 0
+        self._capacity = 0
+
+        # The file stays open for as long as frames are appended, close() closes it
+        self._file = open(path, "w+b")  # noqa: SIM115
+        self._map: mmap.mmap | None = None
+        self._frames: np.ndarray | None = None
+        self._resize(max(capacity, 1))
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def _resize(self, capacity: int):
+        # Views into the map have to be gone before it can be closed
+        self._frames = None
+        if self._map is not None:
+            self._map.close()
+
+        self._file.truncate(CAPTURE_HEADER.size + capacity * self._frame_size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._frames = np.ndarray((capacity, self._height, self._width, 3), dtype=np.uint8, buffer=self._map, offset=CAPTURE_HEADER.size)
+        self._capacity = capacity
+        self._write_header()
+
+    def _write_header(self):
+        assert self._map is not None
+        CAPTURE_HEADER.pack_into(self._map, 0, CAPTURE_MAGIC, CAPTURE_VERSION, self._width, self._height, self._count)
+
+    def append(self, frame: np.ndarray):
+        if self._map is None:
+            raise RuntimeError("Capture file is closed")
+        if self._count == self._capacity:
+            self._resize(self._capacity * 2)
+
+        assert self._frames is not None
+        self._frames[self._count] = frame
+        self._count += 1
+        self._write_header()
+
+    def close(self):
+        if self._map is None:
+            return
+
+        # Drop the unused capacity, so the file is exactly as long as its frames
+        self._frames = None
+        self._map.flush()
+        self._map.close()
+        self._map = None
+        self._file.truncate(CAPTURE_HEADER.size + self._count * self._frame_size)
+        self._file.close()
+
+
+def read_capture(path: str | Path) -> np.ndarray:
+    # Maps the frames of a capture file read-only, as an array of shape (frames, height, width, 3)
+    with open(path, "rb") as f:
+        header = f.read(CAPTURE_HEADER.size)
+    if len(header) < CAPTURE_HEADER.size:
+        raise ValueError(f"{path} is not a capture file")
+
+    magic, version, width, height, count = CAPTURE_HEADER.unpack(header)
+    if magic != CAPTURE_MAGIC:
+        raise ValueError(f"{path} is not a capture file")
+    if version != CAPTURE_VERSION:
+        raise ValueError(f"Unsupported capture file version: {version}")
+
+    if count == 0:
+        return np.empty((0, height, width, 3), dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r", offset=CAPTURE_HEADER.size, shape=(count, height, width, 3))
+
+
+class CaptureBackend(HeadlessBackend):
+    # Renders like the headless backend and records every frame it is handed into a capture file.
+    # Nothing waits for a vsync, so frames are captured as fast as they can be rendered.
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self._writer: CaptureWriter | None = None
+
+    @property
+    def writer(self) -> CaptureWriter:
+        if self._writer is None:
+            raise RuntimeError("LEDPanel not initialized. Call initialize() first.")
+        return self._writer
+
+    def initialize(self):
+        self._writer = CaptureWriter(
+            self._config.get("capture_file", "capture.raw"),
+            self.width,
+            self.height,
+            self._config.get("capture_capacity", 1024),
+        )
+
+    def swap(self, damage: list[Rect] | None = None):
+        super().swap(damage)
+        self.writer.append(self._frame)
+
+    def swap_image(self, image: np.ndarray):
+        super().swap_image(image)
+        self.writer.append(image)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
@@ -0,0 +1,145 @@
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from ..font import Font
+from ..raster import Sprite, TextRasterizer, blit
+from .base import Backend, Rect
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+    from .matrix import Canvas, RGBMatrix
+
+
+def bounding_rect(rects: list[Rect]) -> Rect:
+    x0 = min(x for x, _, _, _ in rects)
+    y0 = min(y for _, y, _, _ in rects)
+    x1 = max(x + width for x, _, width, _ in rects)
+    y1 = max(y + height for _, y, _, height in rects)
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+class FramebufferBackend(Backend):
+    MAX_UPLOAD_REGIONS = 8
+
+    supports_sprites = True
+    supports_offscreen = True
+    supports_compositing = True
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+
+        self._matrix: RGBMatrix | None = None
+        self._canvas: Canvas | None = None
+        self._fromarray: Callable[[np.ndarray], Image.Image] | None = None
+
+        # Frames are rendered in Python and uploaded to the matrix in one go on swap()
+        self._frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        self._spare_frame: np.ndarray | None = None
+        self._rasterizers: dict[str, TextRasterizer] = {}
+
+        # Regions uploaded on the previous swap, the canvas we get back from SwapOnVSync is still missing them
+        self._previous_damage: list[Rect] | None = None
+
+    def _get_rasterizer(self, font: Font) -> TextRasterizer:
+        if font.name not in self._rasterizers:
+            self._rasterizers[font.name] = TextRasterizer(font.atlas)
+
+        return self._rasterizers[font.name]
+
+    @property
+    def matrix(self) -> RGBMatrix:
+        if self._matrix is None:
+            raise RuntimeError("LEDPanel not initialized. Call initialize() first.")
+        return self._matrix
+
+    @property
+    def canvas(self) -> Canvas:
+        if self._canvas is None:
+            raise RuntimeError("LEDPanel not initialized. Call initialize() first.")
+        return self._canvas
+
+    @property
+    def fromarray(self) -> Callable[[np.ndarray], Image.Image]:
+        if self._fromarray is None:
+            raise RuntimeError("LEDPanel not initialized. Call initialize() first.")
+        return self._fromarray
+
+    @property
+    def frame(self) -> np.ndarray:
+        return self._frame
+
+    def initialize(self):
+        # Imported here, so subclasses that never talk to a matrix don't need the matrix library (or pillow)
+        from PIL import Image
+
+        from .matrix import create_matrix
+
+        self._matrix, self._canvas = create_matrix(self._config)
+        self._fromarray = Image.fromarray
+
+    def swap(self, damage: list[Rect] | None = None):
+        if damage is None or self._previous_damage is None:
+            regions = [(0, 0, self.width, self.height)]
+        else:
+            regions = self._previous_damage + damage
+
+            # Many small uploads cost more than a single larger one
+            if len(regions) > self.MAX_UPLOAD_REGIONS:
+                regions = [bounding_rect(regions)]
+
+        fromarray = self.fromarray
+        for x, y, width, height in regions:
+            self.canvas.SetImage(fromarray(self._frame[y : y + height, x : x + width]), x, y)
+
+        self._canvas = self.matrix.SwapOnVSync(self._canvas)
+        self._previous_damage = damage
+
+    def swap_image(self, image: np.ndarray):
+        self.canvas.SetImage(self.fromarray(image), 0, 0)
+        self._canvas = self.matrix.SwapOnVSync(self._canvas)
+
+        # Neither canvas holds the frame anymore, the next swap() has to upload all of it
+        self._previous_damage = None
+
+    def clear(self):
+        self._frame.fill(0)
+
+    def clear_rect(self, rect: Rect):
+        x, y, width, height = rect
+        self._frame[y : y + height, x : x + width] = 0
+
+    def draw_text(self, font: Font, x: int, y: int, color: tuple[int, int, int], text: str):
+        rasterizer = self._get_rasterizer(font)
+        blit(self._frame, rasterizer.rasterize(text), x, y + rasterizer.top, color)
+
+    def create_sprite(self, font: Font, color: tuple[int, int, int], text: str, gap: int | None = None) -> Sprite:
+        rasterizer = self._get_rasterizer(font)
+        mask = rasterizer.rasterize(text)
+        if gap is not None:
+            period = np.pad(mask, ((0, 0), (0, gap)))
+            mask = np.concatenate((period, period), axis=1)
+
+        mask.flags.writeable = False
+        return Sprite(mask, rasterizer.top, color)
+
+    def draw_sprite(self, sprite: Sprite, x: int, y: int, window: tuple[int, int] | None = None):
+        mask = sprite.mask
+        if window is not None:
+            start, width = window
+            mask = mask[:, start : start + width]
+
+        blit(self._frame, mask, x, y + sprite.top, sprite.color)
+
+    def begin_offscreen(self):
+        if self._spare_frame is None:
+            self._spare_frame = np.zeros_like(self._frame)
+        self._frame, self._spare_frame = self._spare_frame, self._frame
+
+    def end_offscreen(self):
+        self._frame, self._spare_frame = self._spare_frame, self._frame
+
+    def present_offscreen(self):
+        self._frame, self._spare_frame = self._spare_frame, self._frame
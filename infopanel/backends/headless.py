@@ -0,0 +1,25 @@
+import numpy as np
+
+from .base import Rect
+from .framebuffer import FramebufferBackend
+
+
+class HeadlessBackend(FramebufferBackend):
+    # Renders into the framebuffer exactly like the framebuffer backend, but never uploads it anywhere
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self._frame_count = 0
+
+    @property
+    def frame_count(self) -> int:
+        return self._frame_count
+
+    def initialize(self):
+        pass
+
+    def swap(self, damage: list[Rect] | None = None):
+        self._frame_count += 1
+
+    def swap_image(self, image: np.ndarray):
+        self._frame_count += 1
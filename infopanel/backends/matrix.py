@@ -0,0 +1,32 @@
+from types import ModuleType
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from RGBMatrixEmulator import RGBMatrix
+    from RGBMatrixEmulator.emulation.canvas import Canvas
+
+__all__ = ["create_matrix", "load_matrix_library"]
+
+
+def load_matrix_library(emulator: bool) -> ModuleType:
+    # The emulator mirrors the rgbmatrix API. Only the one the panel config asks for is imported, on first use.
+    if emulator:
+        import RGBMatrixEmulator as library
+    else:
+        import rgbmatrix as library  # type: ignore
+
+    return library
+
+
+def create_matrix(config: dict) -> tuple[RGBMatrix, Canvas]:
+    library = load_matrix_library(config.get("emulator", False))
+
+    options = library.RGBMatrixOptions()
+    options.rows = config["rows"]
+    options.cols = config["cols"]
+    options.chain_length = config.get("chain_length", 1)
+    options.parallel = config.get("parallel", 1)
+    options.hardware_mapping = config.get("hardware_mapping", "regular")
+
+    matrix = library.RGBMatrix(options=options)
+    return matrix, matrix.CreateFrameCanvas()
@@ -0,0 +1,29 @@
+from collections.abc import Callable
+
+import numpy as np
+
+from .base import Rect
+from .framebuffer import FramebufferBackend
+
+
+class RegionBackend(FramebufferBackend):
+    # Renders one region of a larger canvas into a framebuffer of its own. On swap() the changed parts are handed
+    # to present(), which composites them onto the canvas (see Compositor). Drawing is clipped to the region.
+
+    def __init__(self, config: dict, present: Callable[[np.ndarray, list[Rect] | None], None]):
+        super().__init__(config)
+        self._present = present
+
+        # Set after a composited image was presented, the canvas no longer holds the frame
+        self._stale = False
+
+    def initialize(self):
+        pass
+
+    def swap(self, damage: list[Rect] | None = None):
+        self._present(self._frame, None if self._stale else damage)
+        self._stale = False
+
+    def swap_image(self, image: np.ndarray):
+        self._present(image, None)
+        self._stale = True
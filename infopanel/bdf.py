@@ -0,0 +1,239 @@
+import bisect
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from .font import REPLACEMENT_CODEPOINT, TABLE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Glyph rows are stored as 32 bit masks, bit 31 being the leftmost pixel at the pen position
+MAX_GLYPH_WIDTH = 32
+
+CACHE_MAGIC = b"BDFC"
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".bdfc"
+
+# magic, version, reserved, source size, source mtime, glyph count, row count, height, baseline
+CACHE_HEADER = struct.Struct("<4sHHQqIIhh")
+
+
+class BDFFont:
+    class ParseError(Exception):
+        pass
+
+    def __init__(
+        self,
+        height: int,
+        baseline: int,
+        codepoints,
+        advances,
+        tops,
+        row_starts,
+        rows,
+    ):
+        self.height = height
+        self.baseline = baseline
+
+        # Array-backed glyph atlas. Glyph i has advance advances[i], its first bitmap row is drawn
+        # tops[i] pixels below the baseline and its rows are rows[row_starts[i]:row_starts[i + 1]].
+        self.codepoints = codepoints
+        self.advances = advances
+        self.tops = tops
+        self.row_starts = row_starts
+        self.rows = rows
+
+        # Codepoints are sorted, so the replacement glyph (if there is one) can be found by bisection
+        i = bisect.bisect_left(codepoints, REPLACEMENT_CODEPOINT)
+        self._replacement_index = i if i < len(codepoints) and codepoints[i] == REPLACEMENT_CODEPOINT else None
+
+    def __len__(self) -> int:
+        return len(self.codepoints)
+
+    def width_table(self) -> array:
+        i = self._replacement_index
+        fallback = max(self.advances[i], 0) if i is not None else 0
+
+        widths = array("h", [fallback]) * TABLE_SIZE
+        for cp, advance in zip(self.codepoints, self.advances):
+            if cp < TABLE_SIZE:
+                widths[cp] = advance
+
+        return widths
+
+    @staticmethod
+    def load(path: Path, use_cache: bool = True) -> BDFFont:
+        cache_path = path.with_suffix(CACHE_SUFFIX)
+        stat = path.stat()
+
+        if use_cache:
+            try:
+                return BDFFont.load_cache(cache_path, stat)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.info(f"Ignoring font cache '{cache_path.name}': {e}")
+
+        font = BDFFont.parse(path)
+
+        if use_cache:
+            try:
+                font.save_cache(cache_path, stat)
+            except OSError as e:
+                logger.warning(f"Could not write font cache '{cache_path.name}': {e}")
+
+        return font
+
+    @staticmethod
+    def parse(path: Path) -> BDFFont:
+        height = None
+        baseline = None
+
+        glyphs: dict[int, tuple[int, int, list[int]]] = {}
+
+        codepoint = -1
+        advance = 0
+        bbx = None
+        bitmap: list[int] | None = None
+
+        with open(path, "r", encoding="ascii", errors="replace") as f:
+            for line in f:
+                # Bitmap rows make up the bulk of the file, handle them first
+                if bitmap is not None and bbx is not None and not line.startswith("ENDCHAR"):
+                    # Surplus rows are ignored, just like rgbmatrix does
+                    if len(bitmap) >= bbx[1]:
+                        continue
+
+                    hex_row = line.strip()
+                    try:
+                        value = int(hex_row, 16)
+                    except ValueError as e:
+                        raise BDFFont.ParseError(f"Invalid bitmap row '{hex_row}' for codepoint {codepoint}") from e
+
+                    # Left-align the row and move it by the glyph's x offset
+                    value <<= MAX_GLYPH_WIDTH - len(hex_row) * 4
+                    x_offset = bbx[2]
+                    value = value >> x_offset if x_offset >= 0 else value << -x_offset
+
+                    # Pixels past the advance width are dropped
+                    value &= (1 << MAX_GLYPH_WIDTH) - (1 << max(0, MAX_GLYPH_WIDTH - advance))
+                    bitmap.append(value)
+                    continue
+
+                keyword, _, args = line.strip().partition(" ")
+
+                if keyword == "FONTBOUNDINGBOX":
+                    _, height, _, y_offset = map(int, args.split())
+                    baseline = height + y_offset
+                elif keyword == "STARTCHAR":
+                    codepoint, advance, bbx, bitmap = -1, 0, None, None
+                elif keyword == "ENCODING":
+                    codepoint = int(args.split()[0])
+                elif keyword == "DWIDTH":
+                    advance = int(args.split()[0])
+                elif keyword == "BBX":
+                    bbx = tuple(map(int, args.split()))
+                elif keyword == "BITMAP":
+                    bitmap = []
+                elif keyword == "ENDCHAR":
+                    # Incomplete glyphs and glyphs without an encoding are skipped
+                    if codepoint >= 0 and bbx is not None and bitmap is not None and len(bitmap) == bbx[1]:
+                        _, bbx_height, _, bbx_y_offset = bbx
+                        glyphs[codepoint] = (advance, -(bbx_height + bbx_y_offset), bitmap)
+                    bitmap = None
+
+        if height is None or baseline is None:
+            raise BDFFont.ParseError(f"Font '{path.name}' is missing FONTBOUNDINGBOX")
+
+        codepoints = array("I", sorted(glyphs))
+        advances = array("h")
+        tops = array("h")
+        row_starts = array("I", [0])
+        rows = array("I")
+
+        for cp in codepoints:
+            glyph_advance, top, glyph_rows = glyphs[cp]
+            advances.append(glyph_advance)
+            tops.append(top)
+            rows.extend(glyph_rows)
+            row_starts.append(len(rows))
+
+        return BDFFont(height, baseline, codepoints, advances, tops, row_starts, rows)
+
+    @staticmethod
+    def load_cache(cache_path: Path, source_stat: os.stat_result) -> BDFFont:
+        # Arrays are mapped in native byte order, which the cache is always written in
+        if sys.byteorder != "little":
+            raise ValueError("cache is only supported on little-endian machines")
+
+        with open(cache_path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(mapping) < CACHE_HEADER.size:
+            raise ValueError("truncated header")
+
+        magic, version, _, size, mtime_ns, glyph_count, row_count, height, baseline = CACHE_HEADER.unpack_from(mapping)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            raise ValueError(f"unsupported cache version {version}")
+        if size != source_stat.st_size or mtime_ns != source_stat.st_mtime_ns:
+            raise ValueError("font file has changed")
+
+        view = memoryview(mapping)
+        offset = CACHE_HEADER.size
+
+        def take(typecode: str, count: int) -> memoryview:
+            nonlocal offset
+            length = count * struct.calcsize(typecode)
+            if offset + length > len(view):
+                raise ValueError("truncated data")
+            section = view[offset : offset + length].cast(typecode)
+            offset += length
+            return section
+
+        # 32 bit arrays come first, so every section stays aligned
+        codepoints = take("I", glyph_count)
+        row_starts = take("I", glyph_count + 1)
+        rows = take("I", row_count)
+        advances = take("h", glyph_count)
+        tops = take("h", glyph_count)
+
+        return BDFFont(height, baseline, codepoints, advances, tops, row_starts, rows)
+
+    def save_cache(self, cache_path: Path, source_stat: os.stat_result):
+        if sys.byteorder != "little":
+            return
+
+        header = CACHE_HEADER.pack(
+            CACHE_MAGIC,
+            CACHE_VERSION,
+            0,
+            source_stat.st_size,
+            source_stat.st_mtime_ns,
+            len(self.codepoints),
+            len(self.rows),
+            self.height,
+            self.baseline,
+        )
+
+        # Write to a temporary file first, so concurrent starts never map a half-written cache
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(header)
+                f.writelines(
+                    array(typecode, section).tobytes()
+                    for section, typecode in (
+                        (self.codepoints, "I"),
+                        (self.row_starts, "I"),
+                        (self.rows, "I"),
+                        (self.advances, "h"),
+                        (self.tops, "h"),
+                    )
+                )
+            os.replace(tmp_path, cache_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
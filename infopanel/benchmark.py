@@ -0,0 +1,235 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from .hafas import Departure, Him, Location
+from .ledpanel import LEDPanel
+from .widgets.hafas_timetable import HafasTimetable
+from .widgets.text import TextWidget
+
+LINES = ["U2", "U9", "S3", "S5", "S7", "S9", "M45", "245", "X9", "N2"]
+DIRECTIONS = [
+    "S+U Pankow",
+    "Ruhleben",
+    "S Spandau Bhf",
+    "S+U Rathaus Steglitz",
+    "Flughafen BER",
+    "S Erkner Bhf",
+    "U Osloer Str.",
+    "S+U Zoologischer Garten Bhf",
+    "Johannisstift",
+    "S+U Alexanderplatz Bhf/Dircksenstr.",
+]
+
+
+HIMS = [
+    Him(id="him-1", title="Bauarbeiten", body="Zwischen S Westkreuz und S Charlottenburg Ersatzverkehr mit Bussen."),
+    Him(id="him-2", title="Störung", body="Verspätungen wegen eines Polizeieinsatzes."),
+]
+
+
+def synthetic_departures(count: int, rng: random.Random, now: datetime) -> list[Departure]:
+    departures = [
+        Departure(
+            id=f"jny-{i}",
+            name=rng.choice(LINES),
+            direction=rng.choice(DIRECTIONS),
+            planned=now + timedelta(minutes=rng.randint(2, 60)),
+        )
+        for i in range(count)
+    ]
+    departures.sort(key=lambda d: d.time)
+    return departures
+
+
+def percentile(samples: list[float], q: float) -> float:
+    # Nearest-rank percentile of already sorted samples
+    index = min(len(samples) - 1, max(0, round(q * len(samples)) - 1))
+    return samples[index]
+
+
+def measure(fn: Callable[[int], object], iterations: int, alloc_iterations: int) -> dict:
+    # Warm up caches before timing anything
+    for i in range(min(iterations, 100)):
+        fn(i)
+
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter_ns()
+        fn(i)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+
+    # Allocations are measured in a separate pass, tracemalloc slows everything down considerably
+    peaks = [0] * alloc_iterations
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    for i in range(alloc_iterations):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn(iterations + i)
+        peaks[i] = tracemalloc.get_traced_memory()[1] - current
+    blocks_after = sys.getallocatedblocks()
+    tracemalloc.stop()
+
+    samples.sort()
+    total_us = sum(samples)
+    return {
+        "calls": iterations,
+        "fps": iterations / total_us * 1e6 if total_us else None,
+        "latency_us": {
+            "mean": total_us / iterations,
+            "p50": percentile(samples, 0.50),
+            "p90": percentile(samples, 0.90),
+            "p99": percentile(samples, 0.99),
+            "max": samples[-1],
+        },
+        "alloc_peak_bytes": sum(peaks) / len(peaks) if peaks else None,
+        "alloc_net_blocks": (blocks_after - blocks_before) / alloc_iterations if alloc_iterations else None,
+    }
+
+
+def create_panel(backend: str) -> LEDPanel:
+    panel = LEDPanel({"cols": 128, "rows": 64, "backend": backend})
+    panel.initialize()
+    return panel
+
+
+def create_timetable(rng: random.Random, hims: list[Him] | None = None) -> HafasTimetable:
+    # The widget is never started, its data is filled in directly instead of being fetched
+    widget = HafasTimetable(location="Ernst-Reuter-Platz", timezone="Europe/Berlin")
+    widget._status = "ready"
+    widget._location = Location(id="benchmark", name="Ernst-Reuter-Platz")
+    widget._departures = synthetic_departures(10, rng, datetime.now(widget._timezone))
+    widget._hims = list(hims or [])
+    return widget
+
+
+def run_benchmarks(backend: str, iterations: int, alloc_iterations: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    panel = create_panel(backend)
+    texts = [f"{rng.choice(LINES)} {rng.choice(DIRECTIONS)}" for _ in range(64)]
+
+    def draw_text(i: int):
+        panel.draw_text(texts[i % len(texts)], 1, 8)
+
+    def draw_text_truncated(i: int):
+        panel.draw_text(texts[i % len(texts)], 22, 8, max_width=91)
+
+    def line_width(i: int):
+        panel.line_width("regular", texts[i % len(texts)])
+
+    timetable = create_timetable(rng)
+
+    def timetable_render_full(i: int):
+        # Worst case: the panel is cleared, so every element has to be redrawn
+        panel.clear()
+        timetable.render(panel, 0.0)
+        panel.swap()
+
+    def timetable_render_incremental(i: int):
+        # Typical case: a single countdown changes between frames
+        departure = timetable._departures[i % len(timetable._departures)]
+        departure.realtime = departure.planned + timedelta(minutes=i % 60)
+        timetable.render(panel, 0.0)
+        panel.swap()
+
+    ticker_timetable = create_timetable(rng, HIMS)
+
+    def timetable_render_ticker(i: int):
+        # Steady state while disruptions are shown: the ticker moves by a pixel every frame
+        ticker_timetable._scroll_start = time.monotonic() - i / ticker_timetable.params["scroll_speed"]
+        ticker_timetable.render(panel, 0.0)
+        panel.swap()
+
+    ticker = " +++ ".join(texts[:8])
+
+    def marquee(i: int):
+        panel.draw_marquee(ticker, 0, 56, panel.width, i, key="marquee")
+        panel.swap()
+
+    text_widget = TextWidget(text="Hello, World!\nInfo Panel\nBenchmark")
+
+    def text_render_full(i: int):
+        panel.clear()
+        text_widget.render(panel, 0.0)
+        panel.swap()
+
+    cases: dict[str, Callable[[int], object]] = {
+        "draw_text": draw_text,
+        "draw_text_truncated": draw_text_truncated,
+        "line_width": line_width,
+        "hafas_timetable_render_full": timetable_render_full,
+        "hafas_timetable_render_incremental": timetable_render_incremental,
+        "hafas_timetable_render_ticker": timetable_render_ticker,
+        "marquee": marquee,
+        "text_render_full": text_render_full,
+    }
+
+    results = {}
+    for name, fn in cases.items():
+        panel.clear()
+        results[name] = measure(fn, iterations, alloc_iterations)
+
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        res = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=False, cwd=Path(__file__).parent)
+    except OSError:
+        return None
+    return res.stdout.strip() if res.returncode == 0 else None
+
+
+def print_comparison(results: dict, baseline: dict):
+    print(f"{'benchmark':<36} {'baseline p50':>14} {'current p50':>14} {'speedup':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["latency_us"]["p50"]
+        after = result["latency_us"]["p50"]
+        print(f"{name:<36} {before:>12.1f}us {after:>12.1f}us {before / after:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless rendering benchmarks for LEDPanel and widgets")
+    parser.add_argument("--backend", default="headless", help="ledpanel backend to benchmark (default: headless)")
+    parser.add_argument("--iterations", type=int, default=2000, help="timed calls per benchmark")
+    parser.add_argument("--alloc-iterations", type=int, default=200, help="calls per benchmark traced for allocations")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic data")
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file instead of stdout")
+    parser.add_argument("--compare", type=Path, help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(UTC).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "backend": args.backend,
+            "iterations": args.iterations,
+        },
+        "results": run_benchmarks(args.backend, args.iterations, args.alloc_iterations, args.seed),
+    }
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        print_comparison(report["results"], baseline["results"])
+
+
+if __name__ == "__main__":
+    main()
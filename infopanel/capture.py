@@ -0,0 +1,226 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from .backends.capture import CaptureBackend, read_capture
+from .benchmark import DIRECTIONS, HIMS, git_revision, synthetic_departures
+from .hafas import Him, Location
+from .ledpanel import LEDPanel
+from .widgets.hafas_timetable import HafasTimetable
+from .widgets.text import TextWidget
+
+# Captured boards are rendered for this wall clock time (plus a minute per state), so every run draws the same pixels
+CAPTURE_START = datetime(2025, 1, 6, 7, 30, tzinfo=ZoneInfo("Europe/Berlin"))
+
+
+class FrozenTimetable(HafasTimetable):
+    # A timetable whose clock is set by the capture instead of running
+
+    def __init__(self, **params):
+        super().__init__(**params)
+        self.now = CAPTURE_START
+
+    def _now(self) -> datetime:
+        return self.now
+
+
+def create_timetable(hims: list[Him] | None = None, **params) -> FrozenTimetable:
+    # The widget is never started, its data is filled in directly instead of being fetched
+    widget = FrozenTimetable(location="Ernst-Reuter-Platz", timezone="Europe/Berlin", **params)
+    widget._status = "ready"
+    widget._location = Location(id="capture", name="Ernst-Reuter-Platz")
+    widget._hims = list(hims or [])
+    return widget
+
+
+def capture_scenarios(panel: LEDPanel, seed: int) -> dict[str, Callable[[int], None]]:
+    # Every scenario renders state i on its call i, from its own random stream so adding scenarios doesn't change the others
+    def rng(name: str) -> random.Random:
+        return random.Random(f"{seed}:{name}")
+
+    board_rng = rng("hafas_timetable")
+    board = create_timetable()
+
+    def hafas_timetable(i: int):
+        board.now = CAPTURE_START + timedelta(minutes=i)
+        board._departures = synthetic_departures(10, board_rng, board.now)
+        board.render(panel, 0.0)
+        panel.swap()
+
+    ticker_rng = rng("hafas_timetable_ticker")
+    ticker = create_timetable(HIMS)
+    ticker._departures = synthetic_departures(10, ticker_rng, ticker.now)
+
+    def hafas_timetable_ticker(i: int):
+        # Halfway between two pixels, so the scroll offset doesn't depend on how long rendering takes
+        ticker._scroll_start = time.monotonic() - (i + 0.5) / ticker.params["scroll_speed"]
+        ticker.render(panel, 0.0)
+        panel.swap()
+
+    directions_rng = rng("hafas_timetable_scroll_directions")
+    directions = create_timetable(scroll_directions=True)
+
+    def hafas_timetable_scroll_directions(i: int):
+        # New departures every 32 states, scrolled in between
+        if i % 32 == 0:
+            directions._departures = synthetic_departures(10, directions_rng, directions.now)
+        directions._scroll_start = time.monotonic() - (i % 32 + 0.5) / directions.params["scroll_speed"]
+        directions.render(panel, 0.0)
+        panel.swap()
+
+    status = create_timetable()
+
+    def hafas_timetable_status(i: int):
+        status._status = "loading" if i % 2 == 0 else "error"
+        status.render(panel, 0.0)
+        panel.swap()
+
+    text_rng = rng("text")
+    text = TextWidget()
+
+    def text_widget(i: int):
+        text.update_params(text="\n".join(text_rng.choice(DIRECTIONS) for _ in range(text_rng.randint(1, 3))))
+        text.render(panel, 0.0)
+        panel.swap()
+
+    return {
+        "hafas_timetable": hafas_timetable,
+        "hafas_timetable_ticker": hafas_timetable_ticker,
+        "hafas_timetable_scroll_directions": hafas_timetable_scroll_directions,
+        "hafas_timetable_status": hafas_timetable_status,
+        "text": text_widget,
+    }
+
+
+def record_captures(path: Path, frames: int, seed: int, cols: int, rows: int) -> dict:
+    panel = LEDPanel({"cols": cols, "rows": rows, "backend": "capture", "capture_file": str(path), "capture_capacity": frames * 8})
+    panel.initialize()
+    backend = panel.backend
+    assert isinstance(backend, CaptureBackend)
+
+    results = {}
+    try:
+        for name, render in capture_scenarios(panel, seed).items():
+            panel.clear()
+            first_frame = backend.writer.count
+
+            start = time.perf_counter()
+            for i in range(frames):
+                render(i)
+            elapsed = time.perf_counter() - start
+
+            results[name] = {"first_frame": first_frame, "frames": frames, "fps": frames / elapsed if elapsed else None}
+    finally:
+        panel.close()
+
+    return results
+
+
+def diff_captures(golden: np.ndarray, current: np.ndarray, tolerance: int = 0, chunk: int = 256) -> np.ndarray:
+    # Number of pixels per frame with a channel differing by more than tolerance, for the frames both captures have
+    if golden.shape[1:] != current.shape[1:]:
+        raise ValueError(f"Frame sizes differ: {golden.shape[2]}x{golden.shape[1]} and {current.shape[2]}x{current.shape[1]}")
+
+    count = min(len(golden), len(current))
+    mismatches = np.zeros(count, dtype=np.int64)
+    for start in range(0, count, chunk):
+        end = min(start + chunk, count)
+        mismatches[start:end] = np.count_nonzero(diff_mask(golden[start:end], current[start:end], tolerance), axis=(1, 2))
+    return mismatches
+
+
+def diff_mask(golden: np.ndarray, current: np.ndarray, tolerance: int = 0) -> np.ndarray:
+    if tolerance == 0:
+        return np.not_equal(golden, current).any(axis=-1)
+    return (np.abs(golden.astype(np.int16) - current) > tolerance).any(axis=-1)
+
+
+def diff_image(golden: np.ndarray, current: np.ndarray, tolerance: int = 0, scale: int = 4) -> np.ndarray:
+    # Golden frame, current frame and the differing pixels in red over the dimmed golden frame, side by side
+    highlight = golden // 4
+    highlight[diff_mask(golden, current, tolerance)] = (255, 0, 0)
+
+    image = np.concatenate((golden, current, highlight), axis=1)
+    return image.repeat(scale, axis=0).repeat(scale, axis=1)
+
+
+def record_main(args: argparse.Namespace):
+    report = {
+        "meta": {
+            "timestamp": datetime.now(UTC).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "frames": args.frames,
+            "seed": args.seed,
+        },
+        "scenarios": record_captures(args.capture, args.frames, args.seed, args.cols, args.rows),
+    }
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+
+def diff_main(args: argparse.Namespace) -> bool:
+    golden = read_capture(args.golden)
+    current = read_capture(args.current)
+
+    mismatches = diff_captures(golden, current, args.tolerance)
+    failed = np.flatnonzero(mismatches > args.max_pixels)
+
+    if args.diff_dir is not None and len(failed):
+        from PIL import Image
+
+        args.diff_dir.mkdir(parents=True, exist_ok=True)
+        for index in failed[: args.max_images]:
+            Image.fromarray(diff_image(golden[index], current[index], args.tolerance)).save(args.diff_dir / f"frame-{index:06d}.png")
+
+    for index in failed[: args.max_images]:
+        print(f"frame {index}: {mismatches[index]} pixels differ")
+    if len(golden) != len(current):
+        print(f"frame count differs: {len(golden)} golden, {len(current)} current")
+
+    print(f"{len(failed)} of {len(mismatches)} frames differ")
+    return not len(failed) and len(golden) == len(current)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record widget frames headlessly and compare them with golden captures")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record = subparsers.add_parser("record", help="render the capture scenarios into a capture file")
+    record.add_argument("capture", type=Path, help="capture file to write")
+    record.add_argument("--frames", type=int, default=1000, help="states rendered per scenario")
+    record.add_argument("--seed", type=int, default=0, help="seed for the synthetic data")
+    record.add_argument("--cols", type=int, default=128, help="panel width")
+    record.add_argument("--rows", type=int, default=64, help="panel height")
+    record.add_argument("--output", type=Path, help="write the report (frame ranges and fps per scenario) to this file instead of stdout")
+
+    diff = subparsers.add_parser("diff", help="compare a capture with a golden one pixel by pixel, fails if they differ")
+    diff.add_argument("golden", type=Path, help="golden capture file")
+    diff.add_argument("current", type=Path, help="capture file to check")
+    diff.add_argument("--tolerance", type=int, default=0, help="largest channel difference still counted as equal")
+    diff.add_argument("--max-pixels", type=int, default=0, help="differing pixels allowed per frame")
+    diff.add_argument("--diff-dir", type=Path, help="write golden/current/difference images of differing frames here")
+    diff.add_argument("--max-images", type=int, default=20, help="differing frames listed and written at most")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record_main(args)
+    elif not diff_main(args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
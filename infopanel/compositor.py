@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from infopanel.backends import Rect
+from infopanel.backends.region import RegionBackend
+from infopanel.ledpanel import LEDPanel, intersect_rects
+from infopanel.metrics import METRICS, RenderProfiler
+from infopanel.runtime import AsyncRuntime
+from infopanel.scheduler import Scheduler
+
+
+class Compositor:
+    # Drives a canvas of chained or parallel panels that is split into regions. Every region runs its own
+    # scheduler (and with it its own widget rotation) rendering into a framebuffer of its own. The compositor
+    # copies the parts that changed onto the canvas and uploads only those to the panels.
+
+    def __init__(self, regions: list[dict], panel: LEDPanel):
+        self._panel = panel
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        if not panel.supports_compositing:
+            raise ValueError("Regions need a framebuffer backend")
+        if not regions:
+            raise ValueError("No regions configured")
+
+        self._running = False
+        self._lock = threading.Lock()
+
+        # Canvas regions changed since the last upload, set whenever a region hands over a frame
+        self._damage: list[Rect] = []
+        self._wakeup = threading.Event()
+
+        self._upload_time = METRICS.histogram("infopanel_canvas_upload_seconds", "Time spent uploading changed regions to the panels, including the wait for vsync")
+        self._uploaded_pixels = METRICS.counter("infopanel_canvas_uploaded_pixels", "Pixels copied onto the canvas by the regions")
+        METRICS.register_stats("infopanel_sprite_cache", "Text sprite cache of all regions", self._sprite_cache_stats)
+
+        # Data sources of all regions run on a single event loop, so regions showing the same station share
+        # one HAFAS client (and its cache) on the asyncio runtime, too
+        self._runtime = AsyncRuntime() if any(region.get("runtime") == "asyncio" for region in regions) else None
+
+        self._regions = regions
+        self._panels: dict[str, LEDPanel] = {}
+        self._schedulers: dict[str, Scheduler] = {}
+        for region in regions:
+            name = region.get("name")
+            if name is None or name in self._schedulers:
+                raise ValueError(f"Every region needs a unique name, got {name!r}")
+
+            self._panels[name] = self._create_region_panel(region)
+            self._schedulers[name] = Scheduler(region, self._panels[name], runtime=self._runtime, name=name)
+
+    @property
+    def schedulers(self) -> dict[str, Scheduler]:
+        return self._schedulers
+
+    @property
+    def dropped_frames(self) -> int:
+        return sum(scheduler.dropped_frames for scheduler in self._schedulers.values())
+
+    @property
+    def skipped_renders(self) -> int:
+        return sum(scheduler.skipped_renders for scheduler in self._schedulers.values())
+
+    @property
+    def profiler(self) -> RenderProfiler:
+        # cProfile only sees the thread it runs in, so profiles cover the render loop of the first region
+        return next(iter(self._schedulers.values())).profiler
+
+    def _sprite_cache_stats(self) -> dict[str, int]:
+        stats = {}
+        for panel in self._panels.values():
+            for key, value in panel.sprite_cache_stats.items():
+                stats[key] = stats.get(key, 0) + value
+        return stats
+
+    def _create_region_panel(self, region: dict) -> LEDPanel:
+        rect = region.get("rect")
+        if rect is None or len(rect) != 4:
+            raise ValueError(f"Region {region['name']} needs a rect: [x, y, width, height]")
+
+        x, y, width, height = rect
+        if intersect_rects((x, y, width, height), (0, 0, self._panel.width, self._panel.height)) != (x, y, width, height):
+            raise ValueError(f"Region {region['name']} {rect} is outside the {self._panel.width}x{self._panel.height} canvas")
+
+        def present(image: np.ndarray, damage: list[Rect] | None):
+            self._present(x, y, image, damage)
+
+        config = {"cols": width, "rows": height, "sprite_cache_size": self._panel.sprite_cache_size}
+        panel = LEDPanel(config, backend=RegionBackend(config, present))
+        panel.initialize()
+        return panel
+
+    def _present(self, x: int, y: int, image: np.ndarray, damage: list[Rect] | None):
+        # Called by the region schedulers on every swap, copies the changed parts of their frame onto the canvas
+        height, width = image.shape[:2]
+        bounds = (0, 0, width, height)
+        rects = [bounds] if damage is None else [rect for rect in (intersect_rects(rect, bounds) for rect in damage) if rect is not None]
+        if not rects:
+            return
+
+        frame = self._panel.backend.frame
+        with self._lock:
+            for rx, ry, rw, rh in rects:
+                frame[y + ry : y + ry + rh, x + rx : x + rx + rw] = image[ry : ry + rh, rx : rx + rw]
+                self._damage.append((x + rx, y + ry, rw, rh))
+                self._uploaded_pixels.inc(rw * rh)
+
+        self._wakeup.set()
+
+    def _upload(self):
+        # Regions block in _present() while the canvas is uploaded, so no upload shows a half copied frame
+        with self._lock:
+            damage, self._damage = self._damage, []
+            if not damage:
+                return
+
+            start = time.perf_counter()
+            self._panel.backend.swap(damage)
+            self._upload_time.observe(time.perf_counter() - start)
+
+    def reconfigure(self, regions: list[dict]):
+        # Widgets of the existing regions are reloaded, the layout itself is fixed until a restart
+        layout = {region.get("name"): region.get("rect") for region in regions}
+        if layout != {region["name"]: region["rect"] for region in self._regions}:
+            self._logger.warning("Region layout changed, restart to apply it")
+
+        for region in regions:
+            scheduler = self._schedulers.get(region.get("name"))
+            if scheduler is not None:
+                scheduler.reconfigure(region)
+
+    def _run_region(self, name: str, scheduler: Scheduler):
+        try:
+            scheduler.run()
+        except Exception:
+            # A broken region takes the whole canvas down, like a broken scheduler does on a single panel
+            self._logger.exception(f"Scheduler of region {name} failed")
+            self.stop()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+
+    def run(self):
+        self._logger.info(f"Starting compositor with {len(self._schedulers)} regions...")
+
+        self._running = True
+
+        if self._runtime is not None:
+            self._runtime.start()
+
+        threads = [threading.Thread(target=self._run_region, args=(name, scheduler), name=f"Scheduler[{name}]") for name, scheduler in self._schedulers.items()]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while self._running:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                self._upload()
+        finally:
+            self._logger.info("Stopping compositor...")
+
+            for scheduler in self._schedulers.values():
+                scheduler.stop()
+            for thread in threads:
+                thread.join()
+
+            if self._runtime is not None:
+                self._runtime.stop()
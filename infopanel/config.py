@@ -1,13 +1,27 @@
+import logging
+import os
+import threading
+from collections.abc import Callable
+
 import yaml
 
 DEFAULT_CONFIG = """
 ledpanel:
   emulator: true
+  backend: "canvas"  # or "framebuffer" to render with numpy and upload whole frames
   cols: 128
   rows: 64
+  # chain_length: 1  # panels daisy-chained to the right, the canvas is cols * chain_length wide
+  # parallel: 1  # chains stacked on top of each other, the canvas is rows * parallel high
   hardware_mapping: "adafruit-hat"
 
+metrics:
+  log_interval: 300  # seconds between metric summaries in the log, 0 to disable
+  # port: 9100  # serve Prometheus metrics on /metrics and render loop profiles on /profile?seconds=10
+
 scheduler:
+  runtime: "threads"  # or "asyncio" to fetch widget data on a single event loop (with a small thread pool for HAFAS requests)
+  isolation: "none"  # or "process" to fetch and render every widget in a worker process (framebuffer backends only)
   widgets:
     - type: hafas_timetable
       params:
@@ -22,16 +36,90 @@ scheduler:
         timezone: "Europe/Berlin"
         lines: ["S3", "S5", "S7", "S9"]
       duration: 20
+
+# A larger canvas can be split into regions, each running its own widget rotation (framebuffer backends only).
+# Every region takes the same settings as the scheduler section, which is ignored once regions are configured.
+# regions:
+#   - name: "left"
+#     rect: [0, 0, 128, 64]  # x, y, width, height on the canvas
+#     widgets:
+#       - type: hafas_timetable
+#         params:
+#           location: "Ernst-Reuter-Platz"
+#           timezone: "Europe/Berlin"
+#         duration: 20
+#   - name: "right"
+#     rect: [128, 0, 128, 64]
+#     widgets:
+#       - type: text
+#         params:
+#           text: "Hello, World!"
+#         duration: 20
 """
 
 CONFIG = {}
+CONFIG_FILE = "config.yaml"
 
 
-def load_config(filename: str = "config.yaml"):
-    global CONFIG
-
+def read_config(filename: str = CONFIG_FILE) -> dict:
     try:
         with open(filename, "r") as f:
-            CONFIG.update(yaml.safe_load(f))
+            return yaml.safe_load(f) or {}
     except FileNotFoundError:
-        CONFIG.update(yaml.safe_load(DEFAULT_CONFIG))
+        return yaml.safe_load(DEFAULT_CONFIG)
+
+
+def load_config(filename: str = CONFIG_FILE):
+    global CONFIG
+
+    CONFIG.update(read_config(filename))
+
+
+class ConfigWatcher:
+    # Polls the modification time of the config file and passes every new version to on_change.
+    # A stat every few seconds is all it takes, and it works on any filesystem (and with editors replacing the file).
+
+    def __init__(self, on_change: Callable[[dict], None], filename: str = CONFIG_FILE, interval: float = 2):
+        self._on_change = on_change
+        self._filename = filename
+        self._interval = interval
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._version = self._stat()
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self._filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.__class__.__name__, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            version = self._stat()
+            if version is None or version == self._version:
+                continue
+            self._version = version
+
+            try:
+                config = read_config(self._filename)
+            except yaml.YAMLError as e:
+                self._logger.error(f"Ignoring invalid config file: {e}")
+                continue
+            if not isinstance(config, dict):
+                self._logger.error(f"Ignoring invalid config file: expected a mapping, got {type(config).__name__}")
+                continue
+
+            self._logger.info(f"Config file {self._filename} changed, reloading...")
+            self._on_change(config)
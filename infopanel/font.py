@@ -0,0 +1,58 @@
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import accumulate
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .bdf import BDFFont
+
+# Unicode replacement character, drawn in place of glyphs the font doesn't have
+REPLACEMENT_CODEPOINT = 0xFFFD
+
+# Width table covers the basic multilingual plane, everything above falls back to the replacement glyph
+TABLE_SIZE = 0x10000
+
+
+class FontMetrics:
+    def __init__(self, widths: array, height: int, baseline: int):
+        self._widths = widths
+        self._fallback_width = widths[REPLACEMENT_CODEPOINT]
+
+        self.height = height
+        self.baseline = baseline
+
+        # Per-instance cache, so repeated strings (clock, station and line names) are only measured once
+        self.prefix_widths = lru_cache(maxsize=1024)(self._prefix_widths)
+
+    @staticmethod
+    def from_bdf(font: BDFFont) -> FontMetrics:
+        return FontMetrics(font.width_table(), font.height, font.baseline)
+
+    def character_width(self, char: str) -> int:
+        cp = ord(char)
+        return self._widths[cp] if cp < TABLE_SIZE else self._fallback_width
+
+    def _prefix_widths(self, text: str) -> tuple[int, ...]:
+        # prefix[i] is the advance of text[:i]
+        widths = self._widths
+        fallback = self._fallback_width
+        return tuple(accumulate((widths[cp] if cp < TABLE_SIZE else fallback for cp in map(ord, text)), initial=0))
+
+    def line_width(self, text: str) -> int:
+        return self.prefix_widths(text)[-1] - 1  # -1 to remove extra space after the last character
+
+    def fit(self, text: str, max_width: int) -> int:
+        # Number of leading characters whose line width does not exceed max_width
+        prefix = self.prefix_widths(text)
+        return max(0, bisect_right(prefix, max_width + 1) - 1)
+
+
+@dataclass(frozen=True)
+class Font:
+    name: str
+    path: Path
+    atlas: BDFFont
+    metrics: FontMetrics
@@ -0,0 +1,12 @@
+from .aio import AsyncHafasAPI as AsyncHafasAPI
+from .aio import get_shared_async_api as get_shared_async_api
+from .api import Departure as Departure
+from .api import HafasAPI as HafasAPI
+from .api import HafasError as HafasError
+from .api import Him as Him
+from .api import Location as Location
+from .api import hafas_timestamp_to_datetime as hafas_timestamp_to_datetime
+from .api import line_names as line_names
+from .polling import PollingPolicy as PollingPolicy
+from .shared import SharedHafasAPI as SharedHafasAPI
+from .shared import get_shared_api as get_shared_api
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+from collections.abc import Callable
+from datetime import datetime
+
+from .api import Departure, HafasAPI, Him, Location
+from .shared import get_shared_api
+
+
+class AsyncHafasAPI:
+    # Awaitable front of a blocking client for widgets running on the asyncio runtime. Requests run on the event
+    # loop's executor (the runtime's small thread pool) through requests, so TLS (REQUESTS_CA_BUNDLE), proxies and
+    # retries work exactly like on the threads runtime. Wrapping the shared client also shares its cache, coalescing
+    # and batching with the threads runtime.
+
+    def __init__(self, api: HafasAPI):
+        self._api = api
+
+    async def _run(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def request(self, data: dict):
+        return await self._run(self._api.request, data)
+
+    async def request_batch(self, service_requests: list[dict]) -> list[dict]:
+        return await self._run(self._api.request_batch, service_requests)
+
+    async def search_location(self, query: str) -> Location | None:
+        return await self._run(self._api.search_location, query)
+
+    async def list_departures(
+        self,
+        now: datetime,
+        location_id: str,
+        lines: list[str] | None = None,
+        top: int = 10,
+    ) -> tuple[list[Departure], list[Him]]:
+        return await self._run(self._api.list_departures, now, location_id, lines, top)
+
+
+_shared_async_api: AsyncHafasAPI | None = None
+_shared_async_api_lock = threading.Lock()
+
+
+def get_shared_async_api() -> AsyncHafasAPI:
+    global _shared_async_api
+
+    with _shared_async_api_lock:
+        if _shared_async_api is None:
+            _shared_async_api = AsyncHafasAPI(get_shared_api())
+        return _shared_async_api
@@ -0,0 +1,302 @@
+import json
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, tzinfo
+from time import perf_counter
+from typing import ClassVar
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+from ..metrics import METRICS, SIZE_BUCKETS
+
+
+@dataclass
+class Location:
+    id: str
+    name: str
+
+    @staticmethod
+    def from_hafas(loc: dict):
+        return Location(
+            id=loc["lid"],
+            name=loc["name"].replace("(Berlin)", "").strip(),
+        )
+
+
+def line_names(lines: list[str]) -> set[str]:
+    # Line names as they are compared everywhere: product names of the gate and configured lines alike
+    return {line.strip() for line in lines}
+
+
+@dataclass
+class Departure:
+    id: str
+    name: str
+    direction: str
+    planned: datetime
+    realtime: datetime | None = None
+    cancelled: bool = False
+
+    @property
+    def time(self) -> datetime:
+        return self.realtime if self.realtime is not None else self.planned
+
+    def minutes_until(self, now: datetime) -> int:
+        # Whole minutes between the current minute and the departure, like station displays count.
+        # Computed on timestamps, so the result stays correct across midnight and DST changes.
+        minute_start = now.replace(second=0, microsecond=0)
+        return int((self.time.timestamp() - minute_start.timestamp()) // 60)
+
+    @staticmethod
+    def from_hafas(dep: dict, common: dict, tz: tzinfo):
+        stop = dep["stbStop"]
+        realtime = stop.get("dTimeR")
+
+        return Departure(
+            id=dep["jid"],
+            name=common["prodL"][dep["prodX"]]["name"].strip(),
+            direction=dep["dirTxt"].replace("(Berlin)", "").strip(),
+            planned=hafas_timestamp_to_datetime(dep["date"], stop["dTimeS"], tz),
+            realtime=hafas_timestamp_to_datetime(dep["date"], realtime, tz) if realtime else None,
+            cancelled=stop.get("dCncl", False),
+        )
+
+
+@dataclass
+class Him:
+    id: str
+    title: str
+    body: str
+
+    @staticmethod
+    def from_hafas(h: dict) -> Him:
+        return Him(
+            id=h["hid"],
+            title=h["head"],
+            body=h["text"],
+        )
+
+
+class HafasError(Exception):
+    pass
+
+
+def hafas_timestamp_to_datetime(date: str, ts: str, tz: tzinfo) -> datetime:
+    # Times are local to the journey's operating date (YYYYMMDD), prefixed with a day offset (DD) once they run past midnight
+    if len(ts) == 8:
+        days = int(ts[0:2])
+        ts = ts[2:]
+    else:
+        days = 0
+
+    day = datetime.strptime(date, "%Y%m%d").date() + timedelta(days=days)
+    return datetime.combine(day, time(int(ts[0:2]), int(ts[2:4]), int(ts[4:6])), tzinfo=tz)
+
+
+def location_request(query: str) -> dict:
+    return {
+        "meth": "LocMatch",
+        "req": {
+            "input": {
+                "field": "S",
+                "loc": {
+                    "name": query,
+                    "type": "S",
+                },
+            },
+        },
+    }
+
+
+def parse_location(res: dict) -> Location | None:
+    locations = res["svcResL"][0]["res"]["match"]["locL"]
+    if not locations:
+        return None
+
+    location = locations[0]
+    return Location.from_hafas(location)
+
+
+def departures_request(location_id: str, top: int = 10, lines: list[str] | None = None, line_filter: bool = False) -> dict:
+    filters: list[dict] = [
+        {
+            "type": "PROD",
+            "mode": "INC",
+            "value": 127,
+        },
+    ]
+
+    # Optionally let the server drop journeys of other lines, busy stations return a lot less data that way.
+    # It is off by default: how the gate combines several LINE filters hasn't been verified, if it ANDs them
+    # boards with more than one line come back empty. Lines are always checked again in parse_departures().
+    if line_filter:
+        filters.extend({"type": "LINE", "mode": "INC", "value": line} for line in sorted(line_names(lines or [])))
+
+    return {
+        "meth": "StationBoard",
+        "req": {
+            "jnyFltrL": filters,
+            "stbLoc": {
+                "lid": location_id,
+            },
+            "type": "DEP",
+            "sort": "PT",
+            "maxJny": top,
+        },
+    }
+
+
+def parse_departures(res: dict, now: datetime, lines: list[str] | None = None) -> tuple[list[Departure], list[Him]]:
+    # Departure times are created in the timezone of now, which should be the one of the station
+    result = res["svcResL"][0]["res"]
+    common = result["common"]
+
+    # Lines are still checked here, but per product rather than per journey. Journeys of other lines
+    # and cancelled journeys are skipped before anything gets parsed.
+    products = common["prodL"]
+    wanted = None
+    if lines is not None:
+        names = line_names(lines)
+        wanted = {i for i, product in enumerate(products) if product["name"].strip() in names}
+
+    departures = [Departure.from_hafas(d, common, now.tzinfo) for d in result.get("jnyL", []) if (wanted is None or d["prodX"] in wanted) and not d["stbStop"].get("dCncl", False)]
+
+    # remove past departures and sort by departure time
+    departures = [d for d in departures if d.minutes_until(now) > 0]
+    departures.sort(key=lambda d: d.time)
+
+    # Get unique hims, leaving out messages that are no longer active
+    hafas_hims = [him for him in common.get("himL", []) if him.get("act", True)]
+    hafas_hims = list({him["hid"]: him for him in hafas_hims}.values())
+    hims = [Him.from_hafas(h) for h in hafas_hims]
+
+    return departures, hims
+
+
+def split_batch_response(res: dict, count: int) -> list[dict]:
+    service_results = res.get("svcResL", [])
+    if len(service_results) != count:
+        raise HafasError(f"Expected {count} service results, got {len(service_results)}")
+
+    return [{**res, "svcResL": [service_result]} for service_result in service_results]
+
+
+def record_request(service_requests: list[dict], seconds: float, size: int | None):
+    # Gate requests are labelled by their services, a batch can carry the requests of several stations
+    method = "+".join(sorted({data.get("meth", "?") for data in service_requests}))
+    METRICS.histogram("infopanel_hafas_request_seconds", "Latency of HAFAS gate requests", method=method).observe(seconds)
+    if size is None:
+        METRICS.counter("infopanel_hafas_request_errors", "Failed HAFAS gate requests", method=method).inc()
+    else:
+        METRICS.histogram("infopanel_hafas_response_bytes", "Size of HAFAS gate responses", SIZE_BUCKETS, method=method).observe(size)
+
+
+def station_label(data: dict) -> str:
+    # Station a service request is about, by name (the O= part of its location id). Empty for other requests.
+    lid = data.get("req", {}).get("stbLoc", {}).get("lid")
+    if lid is None:
+        return ""
+
+    fields = dict(field.split("=", 1) for field in lid.split("@") if "=" in field)
+    return fields.get("O") or fields.get("L") or lid
+
+
+def record_service_results(service_requests: list[dict], res: dict):
+    # Response size per station, as re-serialized JSON. A batch answers several stations in one gate response,
+    # whose size is only recorded as a whole by record_request().
+    for data, service_result in zip(service_requests, res.get("svcResL", [])):
+        size = len(json.dumps(service_result, separators=(",", ":")))
+        METRICS.histogram(
+            "infopanel_hafas_service_response_bytes",
+            "Size of HAFAS service results",
+            SIZE_BUCKETS,
+            method=data.get("meth", "?"),
+            station=station_label(data),
+        ).observe(size)
+
+
+def service_error(data: dict, res: dict) -> HafasError | None:
+    # The gate answers with HTTP 200 even if a service request failed, the error is reported per service result
+    service_result = res["svcResL"][0]
+    if service_result.get("err", "OK") == "OK":
+        return None
+
+    return HafasError(f"{data.get('meth')} failed: {service_result.get('errTxt', service_result['err'])}")
+
+
+class HafasAPI:
+    ENDPOINT = "https://bvg-apps-ext.hafas.de/gate"
+    BODY: ClassVar[dict] = {
+        "id": "724muxsmmmsph34k",
+        "ver": "1.72",
+        "lang": "deu",
+        "auth": {
+            "type": "AID",
+            "aid": "dVg4TZbW8anjx9ztPwe2uk4LVRi9wO",
+        },
+        "client": {
+            "id": "VBB",
+            "type": "WEB",
+            "name": "webapp",
+            "l": "vs_webapp",
+            "v": 10004,
+        },
+        "formatted": False,
+    }
+    USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:147.0) Gecko/20100101 Firefox/147.0"
+
+    def __init__(self, endpoint: str | None = None, timeout: float = 10, line_filter: bool = False):
+        # Another gate (like the local stand-in server) can be used instead of the BVG one
+        self.endpoint = endpoint or self.ENDPOINT
+        self.line_filter = line_filter
+
+        # Seconds to wait for the gate to connect and for each read, a stalled request mustn't hang a fetch (or shutdown) forever
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        retries = Retry(
+            total=5,
+            backoff_factor=0.1,
+            status_forcelist=[500, 502, 503, 504],
+        )
+        self.session.mount("https://", HTTPAdapter(max_retries=retries))
+        self.session.mount("http://", HTTPAdapter(max_retries=retries))
+
+    def _post(self, service_requests: list[dict]) -> dict:
+        body = {
+            **self.BODY,
+            "svcReqL": service_requests,
+        }
+
+        start = perf_counter()
+        try:
+            res = self.session.post(self.endpoint, json=body, headers={"User-Agent": self.USER_AGENT}, timeout=self.timeout)
+            res.raise_for_status()
+        except requests.RequestException:
+            record_request(service_requests, perf_counter() - start, None)
+            raise
+        record_request(service_requests, perf_counter() - start, len(res.content))
+
+        data = res.json()
+        record_service_results(service_requests, data)
+        return data
+
+    def request(self, data: dict):
+        return self._post([data])
+
+    def request_batch(self, service_requests: list[dict]) -> list[dict]:
+        # Sends several service requests in one gate request and splits the response back up,
+        # so every result looks like the response to a single request()
+        return split_batch_response(self._post(service_requests), len(service_requests))
+
+    def search_location(self, query: str) -> Location | None:
+        return parse_location(self.request(location_request(query)))
+
+    def list_departures(
+        self,
+        now: datetime,
+        location_id: str,
+        lines: list[str] | None = None,
+        top: int = 10,
+    ) -> tuple[list[Departure], list[Him]]:
+        return parse_departures(self.request(departures_request(location_id, top, lines, self.line_filter)), now, lines)
@@ -0,0 +1,65 @@
+import random
+from datetime import datetime
+
+from .api import Departure
+
+
+class PollingPolicy:
+    # Decides how long to wait before the next departure board refresh. The board is polled every
+    # base_interval while something is about to happen, and backs off towards max_interval while it is quiet.
+
+    def __init__(
+        self,
+        base_interval: float = 10,
+        max_interval: float = 300,
+        imminent_minutes: int = 3,
+        error_max_interval: float = 300,
+        rng: random.Random | None = None,
+    ):
+        self._base_interval = base_interval
+        self._max_interval = max(base_interval, max_interval)
+        self._imminent_minutes = imminent_minutes
+        self._error_max_interval = max(base_interval, error_max_interval)
+        self._rng = rng or random.Random()
+
+        # Departure times seen on the previous poll, by journey id
+        self._departure_times: dict[str, datetime] | None = None
+        self._stable_polls = 0
+        self._errors = 0
+
+    def on_success(self, departures: list[Departure], now: datetime) -> tuple[float, str]:
+        self._errors = 0
+
+        departure_times = {d.id: d.time for d in departures}
+        previous_times, self._departure_times = self._departure_times, departure_times
+
+        if not departures:
+            self._stable_polls = 0
+            return self._max_interval, "no upcoming departures"
+
+        if previous_times is None:
+            return self._base_interval, "first board"
+
+        # Journeys that are on both boards but moved in time are delayed (or caught up)
+        changed = any(previous_times.get(id, t) != t for id, t in departure_times.items())
+
+        next_minutes = min(d.minutes_until(now) for d in departures)
+        if changed:
+            self._stable_polls = 0
+            return self._base_interval, "departure times changed"
+        if next_minutes <= self._imminent_minutes:
+            self._stable_polls = 0
+            return self._base_interval, f"next departure in {next_minutes} min"
+
+        # Double the interval with every unchanged board, but be back in time for the next departure
+        self._stable_polls += 1
+        interval = min(self._max_interval, self._base_interval * 2**self._stable_polls)
+        interval = max(self._base_interval, min(interval, (next_minutes - self._imminent_minutes) * 60))
+        return interval, f"board unchanged for {self._stable_polls} polls, next departure in {next_minutes} min"
+
+    def on_error(self) -> tuple[float, str]:
+        # Exponential backoff with full jitter, so widgets failing together don't retry in lockstep
+        self._errors += 1
+        self._stable_polls = 0
+        ceiling = min(self._error_max_interval, self._base_interval * 2**self._errors)
+        return self._rng.uniform(self._base_interval, ceiling), f"{self._errors} consecutive errors"
@@ -0,0 +1,176 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import ClassVar
+
+from ..config import CONFIG
+from ..metrics import METRICS
+from .api import HafasAPI, service_error
+
+
+class SharedHafasAPI(HafasAPI):
+    # Seconds a response stays valid, per service method. Station searches hardly ever change,
+    # departure boards are kept about as long as the default widget refresh interval.
+    DEFAULT_TTLS: ClassVar[dict[str, float]] = {
+        "LocMatch": 24 * 60 * 60,
+        "StationBoard": 10,
+    }
+    DEFAULT_TTL = 10
+
+    def __init__(
+        self,
+        ttls: dict[str, float] | None = None,
+        batch_window: float = 0.05,
+        max_batch_size: int = 16,
+        endpoint: str | None = None,
+        timeout: float = 10,
+        line_filter: bool = False,
+    ):
+        super().__init__(endpoint, timeout, line_filter)
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self._ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+
+        # Requests that miss the cache are collected for batch_window seconds and sent together
+        self._batch_window = batch_window
+        self._max_batch_size = max_batch_size
+        self._batch_lock = threading.Lock()
+        self._batch: list[tuple[dict, Future]] = []
+
+        self._cache_lock = threading.Lock()
+        self._cache: dict[str, tuple[float, dict]] = {}
+        self._in_flight: dict[str, Future] = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        with self._cache_lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "entries": len(self._cache),
+            }
+
+    def request(self, data: dict):
+        key = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        ttl = self._ttls.get(data.get("meth", ""), self.DEFAULT_TTL)
+
+        leader = False
+        with self._cache_lock:
+            # Serve from the cache while the response is fresh
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._hits += 1
+                return entry[1]
+
+            # Join an identical request that is already on its way
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._coalesced += 1
+            else:
+                self._misses += 1
+                future = self._in_flight[key] = Future()
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            res = self._send(data)
+        except Exception as e:
+            with self._cache_lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._cache_lock:
+            del self._in_flight[key]
+            self._store(key, res, time.monotonic() + ttl)
+        future.set_result(res)
+
+        return res
+
+    def _send(self, data: dict) -> dict:
+        if self._batch_window <= 0:
+            # Service errors are checked like those of a batched request, so callers always get a HafasError
+            res = super().request(data)
+            error = service_error(data, res)
+            if error is not None:
+                raise error
+            return res
+
+        future = Future()
+        with self._batch_lock:
+            self._batch.append((data, future))
+            first = len(self._batch) == 1
+            full = len(self._batch) >= self._max_batch_size
+
+        # The first request of a batch waits for others to join, a full batch is sent right away
+        if full:
+            self._flush_batch()
+        elif first:
+            time.sleep(self._batch_window)
+            self._flush_batch()
+
+        return future.result()
+
+    def _flush_batch(self):
+        with self._batch_lock:
+            batch, self._batch = self._batch, []
+
+        if not batch:
+            return
+
+        self._logger.debug(f"Sending {len(batch)} batched requests: {', '.join(data.get('meth', '?') for data, _ in batch)}")
+
+        # Whatever goes wrong is handed to every caller of the batch, none of them may be left waiting
+        try:
+            responses = self.request_batch([data for data, _ in batch])
+        except Exception as e:  # noqa: BLE001
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        # A failed service request only fails its own caller
+        for (data, future), res in zip(batch, responses):
+            error = service_error(data, res)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(res)
+
+    def _store(self, key: str, res: dict, expires: float):
+        # Drop expired responses while we are at it, the cache only ever holds a few dozen entries
+        now = time.monotonic()
+        for expired in [k for k, (e, _) in self._cache.items() if e <= now]:
+            del self._cache[expired]
+
+        self._cache[key] = (expires, res)
+
+
+_shared_api: SharedHafasAPI | None = None
+_shared_api_lock = threading.Lock()
+
+
+def get_shared_api() -> SharedHafasAPI:
+    global _shared_api
+
+    with _shared_api_lock:
+        if _shared_api is None:
+            config = CONFIG.get("hafas", {})
+            api = _shared_api = SharedHafasAPI(
+                ttls=config.get("cache_ttl"),
+                batch_window=config.get("batch_window", 0.05),
+                max_batch_size=config.get("max_batch_size", 16),
+                endpoint=config.get("endpoint"),
+                timeout=config.get("timeout", 10),
+                line_filter=config.get("line_filter", False),
+            )
+            METRICS.register_stats("infopanel_hafas_cache", "Shared HAFAS response cache", lambda: api.stats)
+        return _shared_api
@@ -0,0 +1,226 @@
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+LINES = ["U2", "U9", "S3", "S5", "S7", "S9", "M45", "245", "X9", "N2"]
+DIRECTIONS = ["S+U Pankow", "Ruhleben", "S Spandau Bhf", "Flughafen BER", "S Erkner Bhf", "U Osloer Str.", "S+U Zoologischer Garten Bhf"]
+
+
+class StandinGate:
+    # Answers mgate service requests like the HAFAS gate does, from recordings or with synthetic boards.
+    # Boards are generated from a per-station timetable, so consecutive polls see the same journeys moving closer.
+
+    def __init__(
+        self,
+        departures: int = 50,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        service_error_rate: float = 0.0,
+        padding: int = 0,
+        timezone: str = "Europe/Berlin",
+        recordings: Path | None = None,
+        seed: int = 0,
+    ):
+        self._departures = departures
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._service_error_rate = service_error_rate
+        self._padding = "x" * padding
+        self._timezone = ZoneInfo(timezone)
+        self._seed = seed
+        self._rng = random.Random(seed)
+
+        # Recorded service results by method, served instead of synthetic ones
+        self._recordings: dict[str, dict] = {}
+        if recordings is not None:
+            for path in recordings.glob("*.json"):
+                self._recordings[path.stem] = json.loads(path.read_text())
+
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "service_requests": 0, "errors": 0, "service_errors": 0, "bytes": 0}
+
+    @property
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def record(self, **counts: int):
+        with self._lock:
+            for key, value in counts.items():
+                self._stats[key] += value
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self._latency + self._rng.uniform(-self._jitter, self._jitter))
+
+    def fail(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self._error_rate
+
+    def handle(self, body: dict) -> dict:
+        service_results = [self._service_result(data) for data in body.get("svcReqL", [])]
+        self.record(requests=1, service_requests=len(service_results))
+        return {"ver": body.get("ver"), "lang": body.get("lang"), "err": "OK", "svcResL": service_results}
+
+    def _service_result(self, data: dict) -> dict:
+        method = data.get("meth", "")
+        with self._lock:
+            failed = self._rng.random() < self._service_error_rate
+        if failed:
+            self.record(service_errors=1)
+            return {"meth": method, "err": "H9220", "errTxt": "Stand-in service error"}
+
+        if method in self._recordings:
+            return {"meth": method, "err": "OK", **self._recordings[method]}
+        if method == "LocMatch":
+            return {"meth": method, "err": "OK", "res": self._location_match(data["req"])}
+        if method == "StationBoard":
+            return {"meth": method, "err": "OK", "res": self._station_board(data["req"])}
+
+        return {"meth": method, "err": "METHOD_NA", "errTxt": f"Unknown method {method}"}
+
+    def _location_match(self, req: dict) -> dict:
+        name = req["input"]["loc"]["name"]
+        station_id = zlib.crc32(name.encode()) % 1000000
+        return {"match": {"locL": [{"lid": f"A=1@O={name}@L={station_id}@", "name": name}]}}
+
+    def _station_board(self, req: dict) -> dict:
+        lid = req["stbLoc"]["lid"]
+        top = min(req.get("maxJny", self._departures), self._departures)
+
+        # Honor the line filters (one per line), a value is a single line name
+        lines = [f["value"] for f in req.get("jnyFltrL", []) if f.get("type") == "LINE" and f.get("mode") == "INC"] or LINES
+        products = list(dict.fromkeys(LINES + lines))
+
+        # Every station has its own fixed timetable: a departure every headway seconds, starting at phase
+        station = random.Random(f"{self._seed}:{lid}")
+        headway = station.randint(60, 600)
+        phase = station.randint(0, headway)
+
+        now = datetime.now(self._timezone)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        first = int((now.timestamp() - phase) // headway) + 1
+
+        journeys = []
+        for n in range(first, first + top):
+            journey = random.Random(f"{self._seed}:{lid}:{n}")
+            planned = datetime.fromtimestamp(phase + n * headway, self._timezone)
+            delay = timedelta(minutes=journey.choice([0, 0, 0, 1, 2, 5]))
+            stop = {"dTimeS": self._hafas_time(today, planned)}
+            if journey.random() < 0.8:
+                stop["dTimeR"] = self._hafas_time(today, planned + delay)
+            if journey.random() < 0.02:
+                stop["dCncl"] = True
+
+            journeys.append({
+                "jid": f"{lid}|{n}",
+                "prodX": products.index(journey.choice(lines)),
+                "dirTxt": journey.choice(DIRECTIONS),
+                "date": today.strftime("%Y%m%d"),
+                "stbStop": stop,
+            })
+
+        return {
+            "common": {
+                "prodL": [{"name": line} for line in products],
+                "himL": [{"hid": f"{lid}|him", "head": "Bauarbeiten", "text": "Ersatzverkehr mit Bussen.", "act": True}],
+            },
+            "jnyL": journeys,
+            "padding": self._padding,
+        }
+
+    @staticmethod
+    def _hafas_time(day: datetime, moment: datetime) -> str:
+        # HHMMSS on the operating day, prefixed with a day offset once it runs past midnight
+        days = (moment.date() - day.date()).days
+        return f"{days:02d}{moment:%H%M%S}" if days else f"{moment:%H%M%S}"
+
+
+def create_server(gate: StandinGate, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        # Kept-alive connections, like the real gate
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            time.sleep(gate.delay())
+
+            if gate.fail():
+                gate.record(errors=1)
+                self._respond(503, b"Service unavailable")
+                return
+
+            data = json.dumps(gate.handle(body)).encode()
+            gate.record(bytes=len(data))
+            self._respond(200, data, "application/json")
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._respond(200, json.dumps(gate.stats).encode(), "application/json")
+            else:
+                self._respond(404, b"Not found")
+
+        def _respond(self, status: int, data: bytes, content_type: str = "text/plain"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the HAFAS gate, serving recorded or synthetic responses")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on, 0 picks a free one")
+    parser.add_argument("--departures", type=int, default=50, help="journeys per departure board (at most)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds every request takes")
+    parser.add_argument("--jitter", type=float, default=0.02, help="random variation of the latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 503")
+    parser.add_argument("--service-error-rate", type=float, default=0.0, help="share of service requests that fail")
+    parser.add_argument("--padding", type=int, default=0, help="bytes of filler added to every departure board")
+    parser.add_argument("--timezone", default="Europe/Berlin", help="timezone of the generated departure times")
+    parser.add_argument("--recordings", type=Path, help="directory of recorded service results (<method>.json) to serve")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic timetables")
+    args = parser.parse_args()
+
+    gate = StandinGate(
+        departures=args.departures,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        service_error_rate=args.service_error_rate,
+        padding=args.padding,
+        timezone=args.timezone,
+        recordings=args.recordings,
+        seed=args.seed,
+    )
+    server = create_server(gate, args.host, args.port)
+
+    # The load test harness reads the address from the first line
+    print(f"Listening on http://{args.host}:{server.server_port}/gate", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
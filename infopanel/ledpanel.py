@@ -1,26 +1,80 @@
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
 from pathlib import Path
-from typing import TYPE_CHECKING
 
-from .config import CONFIG
+import numpy as np
 
-if CONFIG.get("ledpanel", {}).get("emulator", False):
-    from RGBMatrixEmulator import RGBMatrix, RGBMatrixOptions, graphics
+from .backends import BACKENDS, Backend, Rect, get_backend_class
+from .bdf import BDFFont
+from .font import Font, FontMetrics
 
-    if TYPE_CHECKING:
-        from RGBMatrixEmulator.emulation.canvas import Canvas
-else:
-    from rgbmatrix import RGBMatrix, RGBMatrixOptions, graphics  # type: ignore
+
+@dataclass
+class RetainedText:
+    args: tuple
+    font: Font
+    x: int
+    y: int
+    color: tuple[int, int, int]
+    text: str
+    rect: Rect | None
+    result: tuple[int, int, int, int]
+    sprite: object | None = None
+    window: tuple[int, int] | None = None  # Visible columns of the sprite, for marquees
+
+
+@dataclass(frozen=True)
+class PreparedText:
+    text: str  # Truncated text, including the ellipsis
+    width: int
+    advance: int
+    sprite: object | None  # Backend specific, None if the backend draws text directly
+
+
+def intersect_rects(a: Rect, b: Rect) -> Rect | None:
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
 
 
 class LEDPanel:
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, backend: Backend | None = None):
         self._config = config
 
         assert "cols" in config, "ledpanel config is missing required key 'cols'"
         assert "rows" in config, "ledpanel config is missing required key 'rows'"
 
-        self._matrix: RGBMatrix | None = None
-        self._canvas: Canvas | None = None
+        # Get the rendering backend, unless one is handed in (like a region of a larger canvas)
+        if backend is None:
+            backend_type = config.get("backend", "canvas")
+            backend_class = get_backend_class(backend_type)
+            if backend_class is None:
+                raise ValueError(f"Unknown ledpanel backend: {backend_type}. Use one of: {', '.join(BACKENDS.keys())}")
+            backend = backend_class(config)
+
+        self._backend: Backend = backend
+
+        # Regions changed since the last swap (None means the whole panel)
+        self._damage: list[Rect] | None = None
+
+        # Text drawn with a key is remembered, so unchanged text is not redrawn on the next frame
+        self._retained: dict[str, RetainedText] = {}
+        self._touched: set[str] = set()
+
+        # Retained text of a frame rendered off-screen, None while there is none
+        self._offscreen_retained: dict[str, RetainedText] | None = None
+
+        # Truncated and rasterized text by (text, font, color, max_width, ellipsis), least recently used first
+        self._sprite_cache_size = config.get("sprite_cache_size", 256)
+        self._sprites: OrderedDict[tuple, PreparedText] | None = None
+        if self._backend.supports_sprites and self._sprite_cache_size > 0:
+            self._sprites = OrderedDict()
+        self._sprite_hits = 0
+        self._sprite_misses = 0
+        self._sprite_evictions = 0
 
         self._load_fonts({
             "regular": "tb-8.bdf",
@@ -28,67 +82,190 @@ class LEDPanel:
         })
 
     def _load_fonts(self, files: dict[str, str]):
-        self._fonts = {}
+        self._fonts: dict[str, Font] = {}
 
         for name, filename in files.items():
             path = Path(__file__).parent / "fonts" / filename
             if not path.exists():
                 raise FileNotFoundError(f"Font file '{filename}' not found in 'fonts' directory")
 
-            font = graphics.Font()
-            font.LoadFont(path.as_posix())
-            self._fonts[name] = font
+            # Parse the font once into a glyph atlas (memory-mapped from the binary cache on later starts)
+            atlas = BDFFont.load(path)
+            self._fonts[name] = Font(
+                name=name,
+                path=path,
+                atlas=atlas,
+                metrics=FontMetrics.from_bdf(atlas),
+            )
 
-    def _get_font(self, name: str) -> graphics.Font:
+    def _get_font(self, name: str) -> Font:
         if name not in self._fonts:
             raise ValueError(f"Font '{name}' not found. Use one of: {', '.join(self._fonts.keys())}")
 
         return self._fonts[name]
 
+    def _get_metrics(self, name: str) -> FontMetrics:
+        return self._get_font(name).metrics
+
+    @property
+    def backend(self) -> Backend:
+        return self._backend
+
+    @property
+    def damage(self) -> list[Rect] | None:
+        return self._damage
+
     @property
-    def matrix(self) -> RGBMatrix:
-        if self._matrix is None:
-            raise RuntimeError("LEDPanel not initialized. Call initialize() first.")
-        return self._matrix
+    def sprite_cache_size(self) -> int:
+        return self._sprite_cache_size
 
     @property
-    def canvas(self) -> Canvas:
-        if self._canvas is None:
-            raise RuntimeError("LEDPanel not initialized. Call initialize() first.")
-        return self._canvas
+    def sprite_cache_stats(self) -> dict[str, int]:
+        return {
+            "hits": self._sprite_hits,
+            "misses": self._sprite_misses,
+            "evictions": self._sprite_evictions,
+            "entries": len(self._sprites) if self._sprites is not None else 0,
+        }
 
     @property
     def width(self) -> int:
-        return self._config["cols"]
+        return self._backend.width
 
     @property
     def height(self) -> int:
-        return self._config["rows"]
+        return self._backend.height
 
     def initialize(self):
-        options = RGBMatrixOptions()
-        options.rows = self._config["rows"]
-        options.cols = self._config["cols"]
-        options.hardware_mapping = self._config.get("hardware_mapping", "regular")
+        self._backend.initialize()
 
-        self._matrix = RGBMatrix(options=options)
-        self._canvas = self._matrix.CreateFrameCanvas()
+    def close(self):
+        self._backend.close()
 
-    def swap(self):
-        self.matrix.SwapOnVSync(self._canvas)
+    @property
+    def supports_compositing(self) -> bool:
+        return self._backend.supports_compositing
+
+    @property
+    def supports_marquees(self) -> bool:
+        # Marquees scroll through sprites, without a sprite cache draw_marquee() draws truncated text
+        return self._sprites is not None
+
+    def snapshot(self) -> np.ndarray | None:
+        # Copy of the current frame, None if the backend can't composite frames
+        if not self._backend.supports_compositing:
+            return None
+        return self._backend.frame.copy()
+
+    def draw_frame(self, image: np.ndarray):
+        # Replaces the whole frame, e.g. with one rendered in a worker process. Only for backends that support compositing.
+        np.copyto(self._backend.frame, image)
+        self._damage = None
+        self._retained.clear()
+        self._touched.clear()
+
+    def copy_frame(self, out: np.ndarray):
+        # Copies the current frame into out without allocating, the counterpart of draw_frame()
+        np.copyto(out, self._backend.frame)
+
+    def swap(self, composite: Callable[[np.ndarray], np.ndarray] | None = None):
+        # Remove retained text that was not drawn again this frame
+        for key in self._retained.keys() - self._touched:
+            self._invalidate(self._retained.pop(key).rect)
+        self._touched.clear()
+
+        # A composite shows a frame derived from the rendered one, e.g. during transitions
+        if composite is not None:
+            self._backend.swap_image(composite(self._backend.frame))
+        else:
+            self._backend.swap(self._damage)
+        self._damage = []
+
+    def present(self, composite: Callable[[np.ndarray], np.ndarray] | None = None):
+        # Shows the current frame (or a composite of it) again, without finishing a frame like swap() does.
+        # Only for backends that support compositing.
+        frame = self._backend.frame
+        self._backend.swap_image(composite(frame) if composite is not None else frame)
+
+    def render_offscreen(self, render: Callable[[LEDPanel], None]) -> bool:
+        # Renders a frame onto the spare surface without touching the visible one, returns False if the backend has none
+        if not self._backend.supports_offscreen:
+            return False
+
+        state = (self._damage, self._retained, self._touched)
+        self._damage, self._retained, self._touched = None, {}, set()
+
+        self._backend.begin_offscreen()
+        try:
+            self._backend.clear()
+            render(self)
+            self._offscreen_retained = self._retained
+        finally:
+            self._backend.end_offscreen()
+            self._damage, self._retained, self._touched = state
+
+        return True
+
+    def present_offscreen(self) -> bool:
+        # Makes the frame rendered off-screen the current one, the next swap() shows it
+        if self._offscreen_retained is None:
+            return False
+
+        self._backend.present_offscreen()
+        self._retained, self._offscreen_retained = self._offscreen_retained, None
+        self._touched = set(self._retained)
+        self._damage = None
+        return True
+
+    def discard_offscreen(self):
+        self._offscreen_retained = None
 
     def clear(self):
-        self.canvas.Clear()
+        self._backend.clear()
+        self._damage = None
+        self._retained.clear()
+        self._touched.clear()
+
+    def clear_rect(self, x: int, y: int, width: int, height: int):
+        rect = intersect_rects((x, y, width, height), (0, 0, self.width, self.height))
+        if rect is None:
+            return
+
+        self._backend.clear_rect(rect)
+        self._add_damage(rect)
+
+        # Retained text inside the region is gone now and has to be drawn again
+        for key, retained in list(self._retained.items()):
+            if retained.rect is not None and intersect_rects(retained.rect, rect) is not None:
+                del self._retained[key]
+
+    def _add_damage(self, rect: Rect):
+        if self._damage is not None:
+            self._damage.append(rect)
+
+    def _invalidate(self, rect: Rect | None, exclude: str | None = None):
+        # Clear a region and restore any retained text that overlaps it
+        if rect is None:
+            return
+
+        self._backend.clear_rect(rect)
+        self._add_damage(rect)
+
+        for key, retained in self._retained.items():
+            if key != exclude and retained.rect is not None and intersect_rects(retained.rect, rect) is not None:
+                if retained.sprite is not None:
+                    self._backend.draw_sprite(retained.sprite, retained.x, retained.y, retained.window)
+                else:
+                    self._backend.draw_text(retained.font, retained.x, retained.y, retained.color, retained.text)
 
     def character_width(self, font: str, char: str) -> int:
-        return self._get_font(font).CharacterWidth(ord(char))
+        return self._get_metrics(font).character_width(char)
 
     def line_width(self, font: str, text: str) -> int:
-        font_obj = self._get_font(font)
-        return sum(font_obj.CharacterWidth(ord(c)) for c in text) - 1  # -1 to remove extra space after the last character
+        return self._get_metrics(font).line_width(text)
 
     def line_height(self, font: str) -> int:
-        return self._get_font(font).height
+        return self._get_metrics(font).height
 
     def draw_text(
         self,
@@ -102,37 +279,199 @@ class LEDPanel:
         halign: str = "left",
         valign: str = "top",
         ellipsis: str = "...",
+        key: str | None = None,
     ) -> tuple[int, int, int, int]:
-        if not text:
-            return (x, y, 0, 0)
+        # Skip drawing if the keyed text is unchanged since the last frame, otherwise remove its previous content
+        if key is not None:
+            args = (text, x, y, max_width, font, color, halign, valign, ellipsis)
+            self._touched.add(key)
+
+            retained = self._retained.pop(key, None)
+            if retained is not None:
+                if retained.args == args:
+                    self._retained[key] = retained
+                    return retained.result
+
+                self._invalidate(retained.rect, exclude=key)
 
         font_obj = self._get_font(font)
+        metrics = font_obj.metrics
+        prepared = self._prepare_text(text, font_obj, color, max_width, ellipsis)
+        text = prepared.text
+        x, y, result = self._align_text(text, prepared.width, x, y, metrics, halign, valign)
+
+        rect = None
+        if text:
+            if prepared.sprite is not None:
+                self._backend.draw_sprite(prepared.sprite, x, y)
+            else:
+                self._backend.draw_text(font_obj, x, y, color, text)
+
+            # Damage covers the full advance and line height of the drawn text
+            rect = intersect_rects(
+                (x, y - metrics.baseline, prepared.advance, metrics.height),
+                (0, 0, self.width, self.height),
+            )
+            if rect is not None:
+                self._add_damage(rect)
+
+        if key is not None:
+            self._retained[key] = RetainedText(args, font_obj, x, y, color, text, rect, result, prepared.sprite)
+
+        return result
+
+    def draw_marquee(
+        self,
+        text: str,
+        x: int,
+        y: int,
+        width: int,
+        offset: int,
+        *,
+        font: str = "regular",
+        color: tuple[int, int, int] = (255, 255, 255),
+        valign: str = "top",
+        gap: int = 16,
+        key: str | None = None,
+    ) -> tuple[int, int, int, int]:
+        # Draws text scrolled to the left by offset pixels into a window of width pixels, repeating it gap pixels
+        # after its end. Text that fits the window is drawn as is, and so is all text on backends without sprites.
+        font_obj = self._get_font(font)
+        metrics = font_obj.metrics
+        text_width = metrics.line_width(text)
+        if text_width <= width or self._sprites is None:
+            return self.draw_text(text, x, y, max_width=width, font=font, color=color, valign=valign, ellipsis="...", key=key)
+
+        # The strip holds the text twice, so every window of it is one contiguous slice
+        strip = self._prepare_strip(text, font_obj, color, gap)
+        offset %= strip.width
+
+        if key is not None:
+            args = ("marquee", text, x, y, width, offset, font, color, valign, gap)
+            self._touched.add(key)
+
+            retained = self._retained.pop(key, None)
+            if retained is not None:
+                if retained.args == args:
+                    self._retained[key] = retained
+                    return retained.result
+
+                self._invalidate(retained.rect, exclude=key)
+
+        x, y, result = self._align_text(text, width, x, y, metrics, "left", valign)
+        window = (offset, width)
+        self._backend.draw_sprite(strip.sprite, x, y, window)
+
+        rect = intersect_rects((x, y - metrics.baseline, width, metrics.height), (0, 0, self.width, self.height))
+        if rect is not None:
+            self._add_damage(rect)
+
+        if key is not None:
+            self._retained[key] = RetainedText(args, font_obj, x, y, color, text, rect, result, strip.sprite, window)
+
+        return result
+
+    def _prepare_strip(self, text: str, font: Font, color: tuple[int, int, int], gap: int) -> PreparedText:
+        # Marquee strips share the sprite cache with regular text, their width is the scroll period
+        assert self._sprites is not None
+
+        cache_key = ("marquee", text, font.name, color, gap)
+        prepared = self._sprites.get(cache_key)
+        if prepared is not None:
+            self._sprites.move_to_end(cache_key)
+            self._sprite_hits += 1
+            return prepared
+
+        self._sprite_misses += 1
+        period = font.metrics.prefix_widths(text)[-1] + gap
+        prepared = PreparedText(text, period, period, self._backend.create_sprite(font, color, text, gap))
+
+        self._sprites[cache_key] = prepared
+        if len(self._sprites) > self._sprite_cache_size:
+            self._sprites.popitem(last=False)
+            self._sprite_evictions += 1
 
-        # Get text dimensions for alignment
-        character_widths = [font_obj.CharacterWidth(ord(c)) for c in text]
-        text_width = sum(character_widths) - 1  # -1 to remove extra space after the last character
-        text_baseline = font_obj.baseline
+        return prepared
+
+    def _prepare_text(
+        self,
+        text: str,
+        font: Font,
+        color: tuple[int, int, int],
+        max_width: int | None,
+        ellipsis: str,
+    ) -> PreparedText:
+        # Truncates and rasterizes text, or takes both from the sprite cache if the backend supports sprites
+        if self._sprites is None:
+            text, width = self._truncate_text(text, font.metrics, max_width, ellipsis)
+            return PreparedText(text, width, font.metrics.prefix_widths(text)[-1] if text else 0, None)
+
+        cache_key = (text, font.name, color, max_width, ellipsis)
+        prepared = self._sprites.get(cache_key)
+        if prepared is not None:
+            self._sprites.move_to_end(cache_key)
+            self._sprite_hits += 1
+            return prepared
+
+        self._sprite_misses += 1
+        text, width = self._truncate_text(text, font.metrics, max_width, ellipsis)
+        if text:
+            prepared = PreparedText(text, width, font.metrics.prefix_widths(text)[-1], self._backend.create_sprite(font, color, text))
+        else:
+            prepared = PreparedText(text, width, 0, None)
+
+        self._sprites[cache_key] = prepared
+        if len(self._sprites) > self._sprite_cache_size:
+            self._sprites.popitem(last=False)
+            self._sprite_evictions += 1
+
+        return prepared
+
+    def _truncate_text(self, text: str, metrics: FontMetrics, max_width: int | None, ellipsis: str) -> tuple[str, int]:
+        # Returns the text to draw and its width
+        if not text:
+            return "", 0
+
+        text_width = metrics.line_width(text)
 
         # Truncate text if it exceeds max_width
         if max_width is not None and text_width > max_width:
             # Calculate width of truncator
-            truncator_width = sum(font_obj.CharacterWidth(ord(c)) for c in ellipsis) - 1  # -1 to remove extra space after the last character
+            truncator_width = metrics.line_width(ellipsis)
             available_width = max_width - truncator_width
 
-            # Start chopping characters off the end until it fits
-            while text and text_width > available_width:
-                text = text[:-1]  # Remove last character from the text
-                text_width -= character_widths.pop()  # Remove width of the last character from the total width
+            # Find the longest prefix that still fits
+            length = metrics.fit(text, available_width)
+            text_width = metrics.prefix_widths(text)[length] - 1
+            text = text[:length]
 
             # Stop here if no text is left after truncation
             if not text:
-                return (x, y, 0, 0)
+                return "", 0
 
             # Append truncator if text was truncated
             if available_width > 0:
                 text += ellipsis
                 text_width += truncator_width
 
+        return text, text_width
+
+    def _align_text(
+        self,
+        text: str,
+        text_width: int,
+        x: int,
+        y: int,
+        metrics: FontMetrics,
+        halign: str,
+        valign: str,
+    ) -> tuple[int, int, tuple[int, int, int, int]]:
+        # Returns the baseline position of the text and the bounds reported by draw_text()
+        if not text:
+            return x, y, (x, y, 0, 0)
+
+        text_baseline = metrics.baseline
+
         # Adjust x based on horizontal alignment
         if halign == "center":
             x -= text_width // 2
@@ -145,6 +484,4 @@ class LEDPanel:
         elif valign == "top":
             y += text_baseline
 
-        graphics.DrawText(self.canvas, font_obj, x, y, graphics.Color(*color), text)
-
-        return x, y - text_baseline, text_width, text_baseline
+        return x, y, (x, y - text_baseline, text_width, text_baseline)
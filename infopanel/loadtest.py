@@ -0,0 +1,261 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import UTC, datetime
+from pathlib import Path
+
+from .benchmark import git_revision
+from .compositor import Compositor
+from .config import CONFIG
+from .ledpanel import LEDPanel
+from .metrics import METRICS, quantile
+from .scheduler import Scheduler
+
+
+def start_standin(args: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    # The stand-in runs in its own process, so serving requests doesn't show up in our CPU and memory numbers
+    command = [
+        sys.executable,
+        "-m",
+        "infopanel.hafas.standin",
+        "--port=0",
+        f"--departures={args.departures}",
+        f"--latency={args.latency}",
+        f"--jitter={args.jitter}",
+        f"--error-rate={args.error_rate}",
+        f"--padding={args.padding}",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, cwd=Path(__file__).parent.parent)
+
+    assert process.stdout is not None
+    line = process.stdout.readline()
+    if not line.startswith("Listening on "):
+        process.kill()
+        raise RuntimeError(f"Stand-in server failed to start: {line!r}")
+
+    return process, line.removeprefix("Listening on ").strip()
+
+
+def standin_stats(endpoint: str) -> dict | None:
+    url = endpoint.rsplit("/", 1)[0] + "/stats"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as res:
+            return json.loads(res.read())
+    except OSError:
+        return None
+
+
+def rss_bytes() -> int:
+    # Current resident set size, from /proc on Linux
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def worker_stats(pid: int) -> dict | None:
+    # CPU time, memory and threads of a worker process, from /proc on Linux. None once the worker is gone.
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            status = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+
+    return {
+        "cpu_seconds": (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"),
+        "rss_bytes": int(status.get("VmRSS", "0 kB").split()[0]) * 1024,
+        "rss_peak_bytes": int(status.get("VmHWM", "0 kB").split()[0]) * 1024,
+        "threads": int(status.get("Threads", "0")),
+    }
+
+
+def merged_quantiles(name: str) -> dict:
+    # Merges a histogram over all of its labels, e.g. the render times of all widgets
+    histograms = METRICS.histograms(name)
+    if not histograms:
+        return {"count": 0}
+
+    buckets = histograms[0].buckets
+    counts = [0] * (len(buckets) + 1)
+    total = 0.0
+    for histogram in histograms:
+        histogram_counts, histogram_sum = histogram.snapshot()
+        counts = [a + b for a, b in zip(counts, histogram_counts)]
+        total += histogram_sum
+
+    count = sum(counts)
+    result = {
+        "count": count,
+        "mean_ms": total / count * 1000 if count else None,
+    }
+    # Bucket upper bounds, so these are upper estimates
+    for q in (0.50, 0.90, 0.99):
+        value = quantile(buckets, counts, q)
+        result[f"p{q * 100:.0f}_ms"] = value * 1000 if value is not None else None
+    return result
+
+
+def run_load_test(args: argparse.Namespace, endpoint: str) -> dict:
+    CONFIG.setdefault("hafas", {})["endpoint"] = endpoint
+
+    # With several regions the widgets are spread over a wall of chained panels, one region per panel
+    panel = LEDPanel({"cols": 128, "rows": 64, "chain_length": max(args.regions, 1), "backend": "headless"})
+    panel.initialize()
+
+    def region_config(widgets: range) -> dict:
+        return {
+            "runtime": args.runtime,
+            "isolation": args.isolation,
+            "widgets": [
+                {
+                    "type": "hafas_timetable",
+                    "params": {
+                        "location": f"Station {i}",
+                        "timezone": "Europe/Berlin",
+                        "refresh_interval": args.refresh_interval,
+                    },
+                    "duration": args.widget_duration,
+                }
+                for i in widgets
+            ],
+        }
+
+    scheduler: Scheduler | Compositor
+    if args.regions > 0:
+        regions = [{"name": f"panel-{n}", "rect": [n * 128, 0, 128, 64], **region_config(range(n, args.widgets, args.regions))} for n in range(args.regions)]
+        scheduler = Compositor(regions=regions, panel=panel)
+    else:
+        scheduler = Scheduler(config=region_config(range(args.widgets)), panel=panel)
+
+    thread = threading.Thread(target=scheduler.run, name="Scheduler")
+    start_time = time.monotonic()
+    start_cpu = os.times()
+    thread.start()
+
+    # Sample the process (and its widget worker processes) while the widgets are running. Workers are only seen
+    # while they run, so their last sample is kept for the totals.
+    samples = []
+    workers: dict[int, dict] = {}
+    while (elapsed := time.monotonic() - start_time) < args.duration:
+        time.sleep(min(args.sample_interval, args.duration - elapsed))
+        cpu = os.times()
+        running = {}
+        for process in multiprocessing.active_children():
+            stats = worker_stats(process.pid) if process.pid is not None else None
+            if stats is not None:
+                running[process.pid] = workers[process.pid] = stats
+        samples.append({
+            "elapsed": time.monotonic() - start_time,
+            "workers": len(running),
+            "threads": threading.active_count() + sum(s["threads"] for s in running.values()),
+            "rss_bytes": rss_bytes() + sum(s["rss_bytes"] for s in running.values()),
+            "cpu_seconds": cpu.user + cpu.system - start_cpu.user - start_cpu.system + sum(s["cpu_seconds"] for s in workers.values()),
+        })
+
+    scheduler.stop()
+    thread.join()
+
+    elapsed = time.monotonic() - start_time
+    cpu_seconds = samples[-1]["cpu_seconds"] if samples else 0.0
+
+    # Isolated widgets fetch in their workers, whose metrics never reach this process. The stand-in counts what
+    # the gate saw instead, latencies measured in the workers are not available.
+    requests = merged_quantiles("infopanel_hafas_request_seconds")
+    fetch_latency: dict | None = merged_quantiles("infopanel_fetch_seconds")
+    if args.isolation == "process":
+        stats = standin_stats(endpoint)
+        requests = {"count": stats["requests"] if stats is not None else None}
+        fetch_latency = None
+
+    return {
+        "gate_requests": requests["count"],
+        "gate_requests_per_second": requests["count"] / elapsed if requests["count"] is not None else None,
+        "gate_latency": requests,
+        "fetch_latency": fetch_latency,
+        "render_latency": merged_quantiles("infopanel_render_seconds"),
+        "swap_latency": merged_quantiles("infopanel_swap_seconds"),
+        "upload_latency": merged_quantiles("infopanel_canvas_upload_seconds"),
+        "threads_max": max((s["threads"] for s in samples), default=0),
+        "rss_max_bytes": max((s["rss_bytes"] for s in samples), default=0),
+        # Sum of the peaks of this process and every worker, whether they peaked at the same time or not
+        "rss_peak_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 + sum(s["rss_peak_bytes"] for s in workers.values()),
+        "cpu_cores_used": cpu_seconds / elapsed,
+        "dropped_frames": scheduler.dropped_frames,
+        "skipped_renders": scheduler.skipped_renders,
+        "samples": samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test: many timetable widgets against a local HAFAS stand-in")
+    parser.add_argument("--widgets", type=int, default=50, help="timetable widgets (one station each)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--runtime", choices=["threads", "asyncio"], default="threads", help="scheduler runtime for the widget data sources")
+    parser.add_argument("--isolation", choices=["none", "process"], default="none", help="render widgets in worker processes")
+    parser.add_argument("--regions", type=int, default=0, help="spread the widgets over this many regions of a chained canvas")
+    parser.add_argument("--widget-duration", type=float, default=2, help="seconds every widget is shown")
+    parser.add_argument("--refresh-interval", type=int, default=10, help="base refresh interval of the widgets")
+    parser.add_argument("--sample-interval", type=float, default=1, help="seconds between process samples")
+    parser.add_argument("--endpoint", help="gate to test against instead of starting the stand-in")
+    parser.add_argument("--departures", type=int, default=50, help="stand-in: journeys per departure board")
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in: seconds every request takes")
+    parser.add_argument("--jitter", type=float, default=0.02, help="stand-in: random variation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stand-in: share of requests failing with HTTP 503")
+    parser.add_argument("--padding", type=int, default=0, help="stand-in: bytes of filler per departure board")
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="log what the widgets and scheduler are doing")
+    args = parser.parse_args()
+
+    # Gate requests of isolated widgets are counted by the stand-in, an external gate doesn't tell
+    if args.isolation == "process" and args.endpoint is not None:
+        parser.error("--isolation process needs the stand-in gate, it can't be combined with --endpoint")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    standin = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        standin, endpoint = start_standin(args)
+
+    try:
+        results = run_load_test(args, endpoint)
+        if standin is not None:
+            results["standin"] = standin_stats(endpoint)
+    finally:
+        if standin is not None:
+            standin.terminate()
+            standin.wait()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(UTC).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            **{k: v for k, v in vars(args).items() if k not in ("output", "verbose")},
+            "endpoint": endpoint,
+        },
+        "results": results,
+    }
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+import logging
+import threading
+from bisect import bisect_left
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+# Only needed once a profile or the endpoint is requested, they are imported then to keep startup fast
+if TYPE_CHECKING:
+    import cProfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the histogram buckets, in seconds and bytes
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self._value += amount
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)  # The last one counts everything above the largest bucket
+        self._sum = 0.0
+
+    @property
+    def buckets(self) -> tuple[float, ...]:
+        return self._buckets
+
+    def observe(self, value: float):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> tuple[list[int], float]:
+        # Per bucket (not cumulative) counts and the sum of all observations
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+def quantile(buckets: tuple[float, ...], counts: list[int], q: float) -> float | None:
+    # Upper bound of the bucket the q-quantile falls into, inf if it is above the largest bucket
+    total = sum(counts)
+    if not total:
+        return None
+
+    cumulative = 0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        if cumulative >= q * total:
+            return bound
+    return float("inf")
+
+
+class _Family:
+    def __init__(self, name: str, help: str, kind: str, factory: Callable[[], Counter | Histogram]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.factory = factory
+        self.children: dict[tuple[tuple[str, str], ...], Counter | Histogram] = {}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...], extra: str | None = None) -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra is not None:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    # Process-wide registry. Instrumented code looks its metrics up once and keeps the reference,
+    # so recording an observation is a bisect and a locked increment.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families: dict[str, _Family] = {}
+        self._stats: dict[str, tuple[str, Callable[[], dict[str, float]]]] = {}
+
+        # Totals at the time of the previous summary, to log what happened in between
+        self._summary_totals: dict[tuple[str, tuple], tuple[int, float]] = {}
+
+    def _child(self, name: str, help: str, kind: str, factory: Callable[[], Counter | Histogram], labels: dict[str, str]):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = _Family(name, help, kind, factory)
+            elif family.kind != kind:
+                raise ValueError(f"Metric {name} is a {family.kind}, not a {kind}")
+
+            child = family.children.get(key)
+            if child is None:
+                child = family.children[key] = family.factory()
+            return child
+
+    def counter(self, name: str, help: str, **labels: str) -> Counter:
+        return self._child(name, help, "counter", Counter, labels)
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels: str) -> Histogram:
+        return self._child(name, help, "histogram", lambda: Histogram(buckets), labels)
+
+    def histograms(self, name: str) -> list[Histogram]:
+        # All label combinations of a histogram, e.g. to merge them
+        with self._lock:
+            family = self._families.get(name)
+            return [child for child in family.children.values() if isinstance(child, Histogram)] if family is not None else []
+
+    def register_stats(self, name: str, help: str, stats: Callable[[], dict[str, float]]):
+        # Exports the counters other components keep themselves (like cache stats) as a gauge labelled by stat
+        with self._lock:
+            self._stats[name] = (help, stats)
+
+    def _collect(self):
+        # Copies the registry, so metrics can be added while it is exported
+        with self._lock:
+            families = [(family, list(family.children.items())) for family in self._families.values()]
+            stats = list(self._stats.items())
+
+        return families, {name: (help, fn()) for name, (help, fn) in stats}
+
+    def render_prometheus(self) -> str:
+        families, stats = self._collect()
+
+        lines = []
+        for family, children in families:
+            # Counter samples carry the _total suffix, their HELP and TYPE lines have to use the same name
+            name = f"{family.name}_total" if family.kind == "counter" else family.name
+            lines.extend([f"# HELP {name} {family.help}", f"# TYPE {name} {family.kind}"])
+
+            for labels, child in children:
+                if isinstance(child, Counter):
+                    lines.append(f"{name}{_format_labels(labels)} {child.value}")
+                    continue
+
+                counts, total = child.snapshot()
+                cumulative = 0
+                for bound, count in zip(child.buckets, counts):
+                    cumulative += count
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{family.name}_bucket{_format_labels(labels, le)} {cumulative}")
+                cumulative += counts[-1]
+                lines.extend([
+                    f"{family.name}_bucket{_format_labels(labels, 'le="+Inf"')} {cumulative}",
+                    f"{family.name}_sum{_format_labels(labels)} {total}",
+                    f"{family.name}_count{_format_labels(labels)} {cumulative}",
+                ])
+
+        for name, (help, values) in stats.items():
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge"])
+            for stat, value in values.items():
+                lines.append(f"{name}{_format_labels((('stat', stat),))} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> list[str]:
+        # One line per metric that changed since the previous summary
+        families, stats = self._collect()
+
+        lines = []
+        for family, children in families:
+            for labels, child in children:
+                if isinstance(child, Counter):
+                    count, total = child.value, 0.0
+                else:
+                    counts, total = child.snapshot()
+                    count = sum(counts)
+
+                previous_count, previous_total = self._summary_totals.get((family.name, labels), (0, 0.0))
+                self._summary_totals[(family.name, labels)] = (count, total)
+                count -= previous_count
+                total -= previous_total
+                if not count:
+                    continue
+
+                name = f"{family.name}{_format_labels(labels)}"
+                if isinstance(child, Counter):
+                    lines.append(f"{name}: +{count}")
+                elif child.buckets is LATENCY_BUCKETS:
+                    lines.append(f"{name}: {count} observations, mean {total / count * 1000:.2f} ms")
+                else:
+                    lines.append(f"{name}: {count} observations, mean {total / count:.0f}")
+
+        for name, (_, values) in stats.items():
+            lines.append(f"{name}: {', '.join(f'{k}={v}' for k, v in values.items())}")
+
+        return lines
+
+
+METRICS = Metrics()
+
+
+class RenderProfiler:
+    # Captures a cProfile of the scheduler's render loop on demand. cProfile only sees the thread it was
+    # enabled on, so the capture is requested from any thread and started and stopped by the loop itself.
+
+    def __init__(self, wake: Callable[[], None] | None = None):
+        self._wake = wake  # Cuts the loop's sleep short, so it picks up a request right away
+        self._lock = threading.Lock()
+        self._requested: float | None = None  # Duration of the pending capture
+        self._profile: cProfile.Profile | None = None
+        self._end_time = 0.0
+        self._done = threading.Event()
+        self._result: cProfile.Profile | None = None
+
+    def capture(self, seconds: float, sort: str = "cumulative", limit: int = 50) -> str:
+        # Blocks until the loop has been profiled for the given number of seconds, returns the stats as text
+        with self._lock:
+            if self._requested is not None or self._profile is not None:
+                raise RuntimeError("A profile is already being captured")
+            self._requested = seconds
+            self._done.clear()
+
+        if self._wake is not None:
+            self._wake()
+
+        if not self._done.wait(seconds + 30):
+            with self._lock:
+                self._requested = None
+            raise RuntimeError("Render loop did not pick up the profile request")
+
+        import io
+        import pstats
+
+        stream = io.StringIO()
+        pstats.Stats(self._result, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def tick(self, now: float) -> float:
+        # Called by the render loop on every iteration, returns when it has to be called again
+        if self._profile is not None:
+            if now < self._end_time:
+                return self._end_time
+
+            self._profile.disable()
+            self._result, self._profile = self._profile, None
+            self._done.set()
+            return float("inf")
+
+        if self._requested is None:
+            return float("inf")
+
+        with self._lock:
+            seconds, self._requested = self._requested, None
+            import cProfile
+
+            self._profile = cProfile.Profile()
+
+        self._end_time = now + seconds
+        self._profile.enable()
+        return self._end_time
+
+
+class MetricsService:
+    # Optional HTTP endpoint (Prometheus text format on /metrics, profiles on /profile?seconds=N)
+    # and a periodic summary of the metrics in the log
+
+    def __init__(self, config: dict, profiler: RenderProfiler | None = None):
+        self._config = config
+        self._profiler = profiler
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self._server: ThreadingHTTPServer | None = None
+        self._server_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        port = self._config.get("port")
+        if port is not None:
+            self._start_thread(lambda: self._serve(self._config.get("host", "127.0.0.1"), port))
+
+        if self._config.get("log_interval", 300):
+            self._start_thread(self._log_loop)
+
+    def _start_thread(self, target: Callable[[], None]):
+        thread = threading.Thread(target=target, name=self.__class__.__name__, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _serve(self, host: str, port: int):
+        # The server (and the http.server import) is set up in the background, so it doesn't delay the first frame
+        from http.server import ThreadingHTTPServer
+
+        server = ThreadingHTTPServer((host, port), self._handler())
+        server.daemon_threads = True
+        with self._server_lock:
+            if self._stopped.is_set():
+                server.server_close()
+                return
+            self._server = server
+
+        self._logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+        server.serve_forever()
+
+    def stop(self):
+        self._stopped.set()
+        with self._server_lock:
+            server = self._server
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        for thread in self._threads:
+            thread.join()
+
+    @property
+    def port(self) -> int | None:
+        return self._server.server_port if self._server is not None else None
+
+    def _log_loop(self):
+        interval = self._config.get("log_interval", 300)
+        while not self._stopped.wait(interval):
+            lines = METRICS.summary()
+            if lines:
+                self._logger.info(f"Metrics of the last {interval}s:\n  " + "\n  ".join(lines))
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        import pstats
+        from http.server import BaseHTTPRequestHandler
+        from urllib.parse import parse_qs, urlsplit
+
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == "/metrics":
+                    self._respond(200, METRICS.render_prometheus(), "text/plain; version=0.0.4")
+                elif url.path == "/profile" and service._profiler is not None:
+                    query = parse_qs(url.query)
+                    sort = query.get("sort", ["cumulative"])[0]
+                    try:
+                        seconds = float(query.get("seconds", ["10"])[0])
+                    except ValueError as e:
+                        self._respond(400, f"{e}\n")
+                        return
+                    if sort not in pstats.SortKey._value2member_map_:
+                        self._respond(400, f"Unknown sort key: {sort}\n")
+                        return
+
+                    try:
+                        self._respond(200, service._profiler.capture(seconds, sort=sort))
+                    except RuntimeError as e:
+                        self._respond(409, f"{e}\n")
+                else:
+                    self._respond(404, "Not found\n")
+
+            def _respond(self, status: int, body: str, content_type: str = "text/plain"):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                service._logger.debug(format % args)
+
+        return Handler
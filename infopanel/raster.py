@@ -0,0 +1,77 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from .bdf import BDFFont
+from .font import REPLACEMENT_CODEPOINT, TABLE_SIZE
+
+
+class TextRasterizer:
+    def __init__(self, atlas: BDFFont):
+        count = len(atlas)
+
+        advances = np.clip(np.asarray(atlas.advances, dtype=np.int64), 0, 32)
+        tops = np.asarray(atlas.tops, dtype=np.int64)
+        row_starts = np.asarray(atlas.row_starts, dtype=np.int64)
+        rows = np.asarray(atlas.rows, dtype=np.uint32)
+        heights = np.diff(row_starts)
+
+        # All glyphs share one cell, spanning from the highest to the lowest row of any glyph (relative to the baseline)
+        self.top = int(tops.min()) if count else 0
+        bottom = int((tops + heights).max()) if count else 0
+        cell_width = int(advances.max()) if count else 0
+
+        # Unpack every bitmap row into booleans and scatter the rows into their glyph cells.
+        # The extra, empty glyph at the end is used for codepoints without any fallback glyph.
+        cells = np.zeros((count + 1, bottom - self.top, cell_width), dtype=bool)
+        bits = (rows[:, np.newaxis] >> (31 - np.arange(cell_width, dtype=np.uint32))) & 1
+        glyph_of_row = np.repeat(np.arange(count), heights)
+        row_in_cell = np.arange(len(rows)) - np.repeat(row_starts[:-1], heights) + np.repeat(tops - self.top, heights)
+        cells[glyph_of_row, row_in_cell] = bits.astype(bool)
+
+        self._cells = cells
+        self._advances = np.append(advances, 0)
+
+        # Codepoint to glyph index lookup, missing glyphs are drawn as the replacement character
+        codepoints = np.asarray(atlas.codepoints, dtype=np.int64)
+        replacement = np.searchsorted(codepoints, REPLACEMENT_CODEPOINT)
+        self._fallback = int(replacement) if replacement < count and codepoints[replacement] == REPLACEMENT_CODEPOINT else count
+        self._lut = np.full(TABLE_SIZE, self._fallback, dtype=np.int64)
+        in_table = codepoints < TABLE_SIZE
+        self._lut[codepoints[in_table]] = np.flatnonzero(in_table)
+
+    @property
+    def height(self) -> int:
+        return self._cells.shape[1]
+
+    def rasterize(self, text: str) -> np.ndarray:
+        # Returns a boolean mask of the text, its first row is self.top pixels below the baseline
+        codepoints = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        glyphs = np.where(codepoints < TABLE_SIZE, self._lut[np.minimum(codepoints, TABLE_SIZE - 1)], self._fallback)
+
+        # Gather the columns of all glyphs at once, each glyph contributing as many columns as it advances
+        advances = self._advances[glyphs]
+        starts = np.cumsum(advances) - advances
+        columns = np.arange(advances.sum()) - np.repeat(starts, advances)
+        return self._cells[np.repeat(glyphs, advances), :, columns].T
+
+
+@dataclass(frozen=True)
+class Sprite:
+    # Rasterized text in a fixed color, its first row is top pixels below the baseline
+    mask: np.ndarray
+    top: int
+    color: tuple[int, int, int]
+
+
+def blit(frame: np.ndarray, mask: np.ndarray, x: int, y: int, color: tuple[int, int, int]):
+    height, width = mask.shape
+    frame_height, frame_width = frame.shape[:2]
+
+    # Clip the mask against the frame
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, frame_width), min(y + height, frame_height)
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    frame[y0:y1, x0:x1][mask[y0 - y : y1 - y, x0 - x : x1 - x]] = color
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import threading
+from collections.abc import Coroutine
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class AsyncRuntime:
+    # Runs a single asyncio event loop in a background thread, shared by the data sources of all widgets.
+    # Blocking calls (like HAFAS requests) run on the loop's executor, a thread pool of max_workers threads.
+    # Every request that misses the HAFAS cache holds a worker while it waits for its batch, so the default
+    # matches the default batch size. More would only queue for the next batch.
+
+    def __init__(self, max_workers: int = 16):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._max_workers = max_workers
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop | None:
+        return self._loop
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            raise RuntimeError("Runtime is already running")
+
+        self._logger.info("Starting asyncio runtime...")
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix=f"{self.__class__.__name__}Executor")
+        self._loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(target=self._run, name=self.__class__.__name__, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        loop = self._loop
+        assert loop is not None
+
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            # Cancel whatever is still running and give it a chance to clean up
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def spawn(self, coro: Coroutine) -> Future:
+        # Thread-safe, cancelling the returned future cancels the task on the event loop
+        if self._loop is None or not self.running:
+            coro.close()
+            raise RuntimeError("Runtime is not running")
+
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def stop(self, timeout: float = 5):
+        if not self.running:
+            return
+
+        self._logger.info("Stopping asyncio runtime...")
+        assert self._loop is not None and self._thread is not None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+
+        # Blocking calls still running are abandoned, their requests time out on their own
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,23 +1,88 @@
-import datetime
+import functools
+import inspect
 import logging
+import threading
 import time
 
 from infopanel.ledpanel import LEDPanel
-from infopanel.widgets import WIDGETS, Widget
+from infopanel.metrics import METRICS, RenderProfiler
+from infopanel.runtime import AsyncRuntime
+from infopanel.startup import STARTUP
+from infopanel.transitions import TRANSITIONS, Transition
+from infopanel.widgets import WIDGETS, Widget, get_widget_class
 
 
 class Scheduler:
-    def __init__(self, config: dict, panel: LEDPanel):
+    def __init__(self, config: dict, panel: LEDPanel, runtime: AsyncRuntime | None = None, name: str | None = None):
         self._config = config
         self._panel = panel
-        self._logger = logging.getLogger(self.__class__.__name__)
+        self._name = name
+        self._logger = logging.getLogger(self.__class__.__name__ if name is None else f"{self.__class__.__name__}[{name}]")
 
         self._widgets = []
         self._running = False
 
-        self._current_widget_index: int | None = None
-        self._current_widget_switch_time: datetime.datetime = datetime.datetime.now()
+        # Render time and dropped frames of every widget, in the same order as the widgets
+        self._render_times = []
+        self._frame_drops = []
+        # Schedulers of a region (see Compositor) label their metrics with the region name
+        labels = {"region": name} if name is not None else {}
+        self._swap_time = METRICS.histogram("infopanel_swap_seconds", "Time spent handing a frame to the panel, including the wait for vsync", **labels)
+        if name is None:
+            METRICS.register_stats("infopanel_sprite_cache", "Text sprite cache of the panel", lambda: self._panel.sprite_cache_stats)
+
+        # Widget data sources run in their own threads, or as tasks on a single shared event loop.
+        # A runtime handed in is shared with other schedulers and started and stopped by its owner.
+        runtime_type = config.get("runtime", "threads")
+        if runtime_type not in ("threads", "asyncio"):
+            raise ValueError(f"Unknown runtime: {runtime_type}")
+        self._runtime = (runtime or AsyncRuntime()) if runtime_type == "asyncio" else None
+        self._owns_runtime = runtime is None
+
+        # Set whenever the current widget requests a render (or the scheduler is stopped)
+        self._wakeup = threading.Event()
+
+        # Captures profiles of the render loop when requested through the metrics endpoint
+        self._profiler = RenderProfiler(wake=self._wakeup.set)
 
+        self._current_widget_index: int | None = None
+        self._current_widget_switch_time: float = time.monotonic()
+
+        # The next widget refreshes its data warm_ahead seconds before it is shown, and its first frame
+        # is rendered off-screen prerender_ahead seconds before, so the switch itself is just a swap
+        self._warm_ahead = 5
+        self._prerender_ahead = 1
+        self._next_widget_warmed = False
+        self._next_widget_prerendered = False
+
+        # Transition into the current widget, composited from the outgoing frame and the widget's live frame
+        self._transition: Transition | None = None
+        self._transition_start = 0.0
+        self._transition_period = 1 / 60
+
+        # Minimum time between two requested renders
+        self._update_rate = 1 / 30
+
+        # A new config handed over by reconfigure(), applied by the scheduler loop
+        self._pending_config: dict | None = None
+        self._pending_config_lock = threading.Lock()
+
+        # Frame timing of the current widget. Widgets configured with a frame_rate render continuously,
+        # all others only when they request a render (at most once per update_rate).
+        self._frame_period: float | None = None
+        self._last_render_time = 0.0
+        self._next_render_time = 0.0
+        self._frames_rendered = 0
+        self._frames_skipped = 0
+        self._frames_dropped = 0
+        self._dropped_frames = 0
+        self._timeline_anchored = False
+
+        # View state of the frame on the panel, renders are skipped while the current widget's stays the same
+        self._view_state: object | None = None
+        self._skipped_renders = 0
+
+        self._apply_settings()
         self._initialize_widgets()
 
     @property
@@ -27,6 +92,18 @@ class Scheduler:
 
         return self._config["widgets"][self._current_widget_index]
 
+    @property
+    def dropped_frames(self) -> int:
+        return self._dropped_frames
+
+    @property
+    def skipped_renders(self) -> int:
+        return self._skipped_renders
+
+    @property
+    def profiler(self) -> RenderProfiler:
+        return self._profiler
+
     @property
     def current_widget(self) -> Widget | None:
         if self._current_widget_index is None:
@@ -34,24 +111,193 @@ class Scheduler:
 
         return self._widgets[self._current_widget_index]
 
+    def _apply_settings(self):
+        self._warm_ahead = self._config.get("warm_ahead", 5)
+        self._prerender_ahead = self._config.get("prerender_ahead", 1)
+        self._transition_period = 1 / self._config.get("transition_frame_rate", 60)
+        self._update_rate = self._config.get("update_rate", 1 / 30)
+
     def _initialize_widgets(self):
         self._logger.info("Initializing widgets...")
 
         for config in self._config.get("widgets", []):
-            # Get the type of widget
-            widget_type = config.get("type")
-            widget_class = WIDGETS.get(widget_type)
-            if widget_class is None:
-                raise ValueError(f"Unknown widget type: {widget_type}")
-
-            # Instantiate a new instance
-            widget_params = config.get("params", {})
-            widget = widget_class(**widget_params)
-            self._widgets.append(widget)
+            self._widgets.append(self._create_widget(config, self._config))
 
         if not self._widgets:
             raise ValueError("No widgets configured")
 
+        self._initialize_widget_metrics()
+        self._check_transitions()
+
+    @staticmethod
+    def _widget_isolation(widget_config: dict, config: dict) -> str:
+        # Entries may override the scheduler's default
+        return widget_config.get("isolation", config.get("isolation", "none"))
+
+    def _validate_widget_config(self, config: dict, scheduler_config: dict) -> type[Widget]:
+        # Get the type of widget
+        widget_type = config.get("type")
+        widget_class = get_widget_class(widget_type)
+        if widget_class is None:
+            raise ValueError(f"Unknown widget type: {widget_type}. Use one of: {', '.join(WIDGETS.keys())}")
+
+        transition = config.get("transition")
+        if transition is not None and transition not in TRANSITIONS:
+            raise ValueError(f"Unknown transition: {transition}. Use one of: {', '.join(TRANSITIONS.keys())}")
+
+        isolation = self._widget_isolation(config, scheduler_config)
+        if isolation not in ("none", "process"):
+            raise ValueError(f"Unknown isolation: {isolation}. Use one of: none, process")
+        if isolation == "process" and not self._panel.supports_compositing:
+            raise ValueError("Widgets can only be rendered in worker processes with a framebuffer backend")
+
+        # Check the params against the constructor, so a broken config fails before any widget is touched
+        try:
+            inspect.signature(widget_class).bind(**config.get("params", {}))
+        except TypeError as e:
+            raise ValueError(f"Invalid params for widget type {widget_type}: {e}") from e
+
+        return widget_class
+
+    def _create_widget(self, config: dict, scheduler_config: dict) -> Widget:
+        # Instantiate a new instance, in a worker process if the widget is isolated
+        widget_class = self._validate_widget_config(config, scheduler_config)
+        if self._widget_isolation(config, scheduler_config) == "process":
+            from infopanel.widgets.process import ProcessWidget
+
+            widget = ProcessWidget(config["type"], config.get("params", {}), self._panel.width, self._panel.height, self._update_rate)
+        else:
+            widget = widget_class(**config.get("params", {}))
+        widget.set_render_listener(self._on_render_requested)
+        widget.attach_runtime(self._runtime)
+        return widget
+
+    def _initialize_widget_metrics(self):
+        self._render_times = []
+        self._frame_drops = []
+        self._renders_skipped = []
+        for index, config in enumerate(self._config["widgets"]):
+            name = config.get("name", f"{index}:{config['type']}")
+            if self._name is not None:
+                name = f"{self._name}/{name}"
+            self._render_times.append(METRICS.histogram("infopanel_render_seconds", "Time spent in Widget.render", widget=name))
+            self._frame_drops.append(METRICS.counter("infopanel_frames_dropped", "Frames skipped because rendering fell behind", widget=name))
+            self._renders_skipped.append(METRICS.counter("infopanel_renders_skipped", "Requested renders skipped because the view state was unchanged", widget=name))
+
+    def _check_transitions(self):
+        if not self._panel.supports_compositing and any(config.get("transition") for config in self._config["widgets"]):
+            self._logger.warning("Transitions need a framebuffer backend, widgets will be switched with hard cuts")
+
+    def reconfigure(self, config: dict):
+        # Thread-safe, the scheduler loop applies the new config on its next iteration
+        with self._pending_config_lock:
+            self._pending_config = config
+        self._wakeup.set()
+
+    def _apply_pending_config(self, now: float):
+        with self._pending_config_lock:
+            config, self._pending_config = self._pending_config, None
+
+        if config is None:
+            return
+
+        configs = config.get("widgets", [])
+        try:
+            if not configs:
+                raise ValueError("No widgets configured")
+            for widget_config in configs:
+                self._validate_widget_config(widget_config, config)
+        except ValueError as e:
+            self._logger.error(f"Invalid config, keeping the current one: {e}")
+            return
+
+        if config.get("runtime", "threads") != self._config.get("runtime", "threads"):
+            self._logger.warning("Changing the runtime needs a restart, keeping the current one")
+
+        start = time.perf_counter()
+        self._reconcile_widgets(config, now)
+        self._logger.info(f"Applied new config in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def _reconcile_widgets(self, config: dict, now: float):
+        # Diffs the new widget list against the running one. Unchanged widgets are kept with their data,
+        # changed params are applied in place where the widget supports it, and only the rest is recreated.
+        configs = config["widgets"]
+        unused = set(range(len(self._widgets)))
+        widgets: list[Widget | None] = [None] * len(configs)
+
+        # Widgets only carry over between entries of the same type and isolation
+        old = [(widget_config, widget, self._widget_isolation(widget_config, self._config)) for widget_config, widget in zip(self._config["widgets"], self._widgets)]
+        kinds = [(widget_config.get("type"), self._widget_isolation(widget_config, config)) for widget_config in configs]
+
+        # Unchanged entries keep their widget, wherever they moved to
+        for i, widget_config in enumerate(configs):
+            for j in sorted(unused):
+                old_config, _, old_isolation = old[j]
+                if (old_config.get("type"), old_isolation) == kinds[i] and old_config.get("params", {}) == widget_config.get("params", {}):
+                    widgets[i] = old[j][1]
+                    unused.discard(j)
+                    break
+
+        # Widgets of the same type take new params if they can, the one at the same position first
+        updated = 0
+        for i, widget_config in enumerate(configs):
+            if widgets[i] is not None:
+                continue
+
+            candidates = sorted((j for j in unused if (old[j][0].get("type"), old[j][2]) == kinds[i]), key=lambda j: (j != i, j))
+            for j in candidates:
+                if old[j][1].update_params(**widget_config.get("params", {})):
+                    widgets[i] = old[j][1]
+                    unused.discard(j)
+                    updated += 1
+                    break
+
+        kept = sum(widget is not None for widget in widgets) - updated
+        current = self.current_widget
+        current_index = self._current_widget_index
+
+        self._config = config
+        self._apply_settings()
+
+        created = []
+        for i, widget_config in enumerate(configs):
+            if widgets[i] is None:
+                widgets[i] = self._create_widget(widget_config, config)
+                created.append(widgets[i])
+
+        removed = [old[j][1] for j in sorted(unused)]
+        self._logger.info(f"Reconciled widgets: {kept} kept, {updated} updated, {len(created)} created, {len(removed)} removed")
+
+        self._widgets = widgets
+        self._initialize_widget_metrics()
+        self._check_transitions()
+
+        # The next widget may be another one now, get it ready again
+        self._next_widget_warmed = False
+        self._next_widget_prerendered = False
+        self._panel.discard_offscreen()
+
+        for widget in created:
+            widget.start()
+
+        # Widgets are dataclasses without fields, they all compare equal. Look for the same instance.
+        self._current_widget_index = next((i for i, widget in enumerate(widgets) if widget is current), None)
+        if self._current_widget_index is None and current is not None and current_index is not None:
+            # The current widget is gone, continue with the one that took its place
+            current.hide()
+            self._switch_widget(min(current_index, len(widgets) - 1))
+        self._reset_frame_timing(now)
+
+        # Stopping joins the widgets' threads, which may be in the middle of a request. Don't hold up the panel for that.
+        for widget in removed:
+            widget.set_render_listener(None)
+            threading.Thread(target=widget.stop, name=f"{widget.__class__.__name__}.stop", daemon=True).start()
+
+    def _on_render_requested(self, widget: Widget):
+        # Called from the widgets' threads, hidden widgets get their initial render when switched to
+        if widget is self.current_widget:
+            self._wakeup.set()
+
     def _next_widget_index(self) -> int:
         if self._current_widget_index is None:
             return 0
@@ -61,10 +307,11 @@ class Scheduler:
     def _reset_next_widget_switch_time(self):
         assert self.current_widget_config is not None
         duration = self.current_widget_config.get("duration", 10)
-        self._current_widget_switch_time = datetime.datetime.now() + datetime.timedelta(seconds=duration)
+        self._current_widget_switch_time = time.monotonic() + duration
 
-    def _switch_widget(self):
-        next_widget_index = self._next_widget_index()
+    def _switch_widget(self, next_widget_index: int | None = None):
+        if next_widget_index is None:
+            next_widget_index = self._next_widget_index()
 
         # No need to switch if it's the same widget
         if next_widget_index == self._current_widget_index:
@@ -73,24 +320,222 @@ class Scheduler:
 
         self._logger.info("Switching to next widget...")
 
+        # Keep the outgoing frame, if the incoming widget transitions in
+        outgoing = None
+        if self.current_widget is not None and self._config["widgets"][next_widget_index].get("transition"):
+            outgoing = self._panel.snapshot()
+
         # Hide the current widget
         if self.current_widget is not None:
+            self._log_frame_stats()
             self.current_widget.hide()
 
         # Update the current widget index and reset the switch time
         self._current_widget_index = next_widget_index
         self._reset_next_widget_switch_time()
 
-        # Show the widget and request an initial render
+        prerendered = self._next_widget_prerendered
+        self._next_widget_warmed = False
+        self._next_widget_prerendered = False
+
+        self._start_transition(outgoing)
+
         assert self.current_widget is not None
+        if prerendered and self._panel.present_offscreen():
+            # The first frame is ready, put it on the panel right away
+            self.current_widget.show()
+            self._swap(rendered=False)
+            return
+
+        # Start from a blank panel, widgets only redraw what changed between their own frames
+        self._panel.discard_offscreen()
+        self._panel.clear()
+
+        # Show the widget and request an initial render
         self.current_widget.show()
         self.current_widget.request_render()
 
+    def _start_transition(self, outgoing):
+        self._transition = None
+
+        name = self.current_widget_config.get("transition")
+        if name is None or outgoing is None:
+            return
+
+        duration = self.current_widget_config.get("transition_duration", 0.5)
+        self._transition = TRANSITIONS[name](outgoing, duration)
+        self._transition_start = time.monotonic()
+
+    def _swap(self, rendered: bool = True):
+        start = time.perf_counter()
+        self._present_frame(rendered)
+        self._swap_time.observe(time.perf_counter() - start)
+
+        if not STARTUP.done:
+            STARTUP.first_frame()
+
+    def _present_frame(self, rendered: bool):
+        transition = self._transition
+        if transition is None:
+            self._panel.swap()
+            return
+
+        progress = (time.monotonic() - self._transition_start) / transition.duration
+        if progress >= 1:
+            self._transition = None
+            composite = None
+        else:
+            composite = functools.partial(transition.composite, progress=progress)
+
+        # Frames without a render only show the transition's progress, there is nothing to finish
+        if rendered:
+            self._panel.swap(composite)
+        else:
+            self._panel.present(composite)
+
+    def _prepare_next_widget(self, now: float) -> float:
+        # Warms up and prerenders the next widget once it is time to, returns when to check again
+        next_widget_index = self._next_widget_index()
+        if next_widget_index == self._current_widget_index:
+            return float("inf")
+
+        widget = self._widgets[next_widget_index]
+
+        if not self._next_widget_warmed:
+            warm_time = self._current_widget_switch_time - self._warm_ahead
+            if now < warm_time:
+                return warm_time
+
+            widget.warm()
+            self._next_widget_warmed = True
+
+        if not self._next_widget_prerendered:
+            prerender_time = self._current_widget_switch_time - self._prerender_ahead
+            if now < prerender_time:
+                return prerender_time
+
+            # Requests made from here on are rendered after the switch, on top of the prerendered frame
+            widget.clear_render_request()
+            self._panel.render_offscreen(lambda panel: widget.render(panel, 0.0))
+            self._next_widget_prerendered = True
+
+        return float("inf")
+
+    def _reset_frame_timing(self, now: float):
+        frame_rate = self.current_widget_config.get("frame_rate")
+        self._frame_period = 1 / frame_rate if frame_rate else None
+        self._last_render_time = now
+        self._next_render_time = now
+        self._frames_rendered = 0
+        self._frames_skipped = 0
+        self._frames_dropped = 0
+        self._timeline_anchored = False
+
+        # The panel shows another frame now (or a prerendered one), the next requested render has to happen
+        self._view_state = None
+
+    def _log_frame_stats(self):
+        if self._frame_period is None:
+            return
+
+        self._logger.info(f"Rendered {self._frames_rendered} frames at {1 / self._frame_period:.0f} fps, skipped {self._frames_skipped}, dropped {self._frames_dropped}")
+
+    def _render(self, now: float, delta_time: float) -> bool:
+        # Renders and swaps the current widget, returns False if the render was skipped
+        widget = self.current_widget
+        assert widget is not None
+        assert self._current_widget_index is not None
+
+        # The panel still shows what the widget would draw, unless a render it scheduled itself is due
+        view_state = widget.view_state()
+        render_deadline = widget.render_deadline
+        if (render_deadline is None or render_deadline > now) and view_state is not None and view_state == self._view_state:
+            widget.clear_render_request(keep_deadline=True)
+            self._renders_skipped[self._current_widget_index].inc()
+            self._skipped_renders += 1
+            self._frames_skipped += 1
+            return False
+
+        widget.clear_render_request()
+        start = time.perf_counter()
+        widget.render(self._panel, delta_time)
+        self._render_times[self._current_widget_index].observe(time.perf_counter() - start)
+        self._swap()
+        self._frames_rendered += 1
+        self._view_state = view_state
+        return True
+
+    def _render_requested(self, now: float, update_rate: float) -> float:
+        # Renders the current widget if the update rate allows it, returns when to check again
+        if now < self._next_render_time:
+            return self._next_render_time
+
+        if self._render(now, now - self._last_render_time):
+            self._last_render_time = now
+            self._next_render_time = now + update_rate
+        return float("inf")
+
+    def _render_transition(self, now: float) -> float:
+        # Shows the next transition frame, rendering the incoming widget first if it wants to, returns when to continue
+        assert self.current_widget is not None
+        render_deadline = self.current_widget.render_deadline
+        if self._frame_period is not None or self.current_widget.render_requested or (render_deadline is not None and render_deadline <= now):
+            rendered = self._render(now, now - self._last_render_time)
+            if rendered:
+                self._last_render_time = now
+        else:
+            rendered = False
+        if not rendered:
+            self._swap(rendered=False)
+
+        if self._transition is None:
+            # Continue with the widget's own frame timing
+            self._reset_frame_timing(now)
+            return now
+
+        return now + self._transition_period
+
+    def _render_continuous(self, now: float) -> float:
+        # Renders the next frame once it is due, returns when the frame after it is due
+        period = self._frame_period
+        assert period is not None
+
+        if now < self._next_render_time:
+            return self._next_render_time
+
+        # Skip the frames we are too late for, but stay on the original frame timeline so there is no drift
+        missed = int((now - self._next_render_time) // period)
+        self._frames_dropped += missed
+        self._dropped_frames += missed
+        if missed:
+            assert self._current_widget_index is not None
+            self._frame_drops[self._current_widget_index].inc(missed)
+        frame_time = self._next_render_time + missed * period
+
+        rendered = self._render(now, frame_time - self._last_render_time)
+
+        # SwapOnVSync returns right after the vertical sync, anchor the timeline there once. Skipped frames
+        # didn't swap, they stay on the timeline like rendered ones.
+        if rendered and not self._timeline_anchored:
+            self._timeline_anchored = True
+            frame_time = time.monotonic()
+
+        self._last_render_time = frame_time
+        self._next_render_time = frame_time + period
+        return self._next_render_time
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+
     def run(self):
         self._logger.info("Starting scheduler...")
 
         self._running = True
 
+        if self._runtime is not None and self._owns_runtime:
+            self._runtime.start()
+
         # Start all widgets
         for widget in self._widgets:
             widget.start()
@@ -98,30 +543,50 @@ class Scheduler:
         try:
             # Show the first widget
             self._switch_widget()
+            self._reset_frame_timing(time.monotonic())
 
-            last_render_time = datetime.datetime.now()
-
-            update_rate = self._config.get("update_rate", 1 / 30)  # Default to 30 updates per second
             while self._running:
-                now = datetime.datetime.now()
+                # Clear before looking for work, so requests arriving from here on cut the next wait short
+                self._wakeup.clear()
+                now = time.monotonic()
+
+                # Apply a reloaded config
+                self._apply_pending_config(now)
 
                 # Switch to the next widget if the time has come
                 if self._current_widget_switch_time <= now:
                     self._switch_widget()
-                    last_render_time = now
+                    self._reset_frame_timing(now)
 
-                # Render the current widget if it has requested a render
+                # Render the current widget if it is due, and find out when we have to wake up next
                 assert self.current_widget is not None
-                if self.current_widget.render_requested:
-                    delta_time = (now - last_render_time).total_seconds()
-                    self.current_widget.render(self._panel, delta_time)
-                    self._panel.swap()
-                    last_render_time = now
-
-                time.sleep(update_rate)
+                deadline = self._current_widget_switch_time
+                render_deadline = self.current_widget.render_deadline
+                if self._transition is not None:
+                    deadline = min(deadline, self._render_transition(now))
+                elif self._frame_period is not None:
+                    deadline = min(deadline, self._render_continuous(now))
+                elif self.current_widget.render_requested or (render_deadline is not None and render_deadline <= now):
+                    deadline = min(deadline, self._render_requested(now, self._update_rate))
+                elif render_deadline is not None:
+                    deadline = min(deadline, render_deadline)
+
+                # Get the next widget ready while the current one is idle
+                deadline = min(deadline, self._prepare_next_widget(time.monotonic()))
+
+                # Start or finish a requested profile
+                deadline = min(deadline, self._profiler.tick(time.monotonic()))
+
+                # Sleep until a render is requested or the next deadline is reached
+                timeout = deadline - time.monotonic()
+                if timeout > 0 and self._running:
+                    self._wakeup.wait(timeout)
         finally:
             self._logger.info("Stopping scheduler...")
 
             # Stop all widgets
             for widget in self._widgets:
                 widget.stop()
+
+            if self._runtime is not None and self._owns_runtime:
+                self._runtime.stop()
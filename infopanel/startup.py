@@ -0,0 +1,68 @@
+import logging
+import os
+import time
+
+from .metrics import METRICS
+
+
+def process_age() -> float | None:
+    # Seconds since the process was started, including the interpreter's own startup. Linux only.
+    try:
+        with open("/proc/self/stat") as f:
+            stat = f.read()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except OSError:
+        return None
+
+    # The command name may contain spaces, the fields we want come after its closing parenthesis
+    start_ticks = int(stat.rpartition(")")[2].split()[19])
+
+    return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+
+
+class StartupTimer:
+    # Times the phases between launching the process and the first frame on the panel, which is how long
+    # the panel stays dark at boot. Phases are marked as they finish, the summary is logged with the first frame.
+
+    def __init__(self):
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        # Anchor at the process start if we can, so interpreter startup and imports are accounted for as well
+        age = process_age()
+        now = time.monotonic()
+        self._start = now - (age or 0.0)
+        self._last = now
+        self._phases: dict[str, float] = {}
+        if age is not None:
+            self._phases["launch"] = age
+
+        self._done = False
+        METRICS.register_stats("infopanel_startup_seconds", "Duration of the startup phases up to the first frame", lambda: self._phases)
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def mark(self, phase: str):
+        if self._done:
+            return
+
+        now = time.monotonic()
+        self._phases[phase] = now - self._last
+        self._last = now
+
+    def first_frame(self):
+        if self._done:
+            return
+
+        self.mark("first frame")
+        self._done = True
+
+        total = self._last - self._start
+        self._phases["total"] = total
+        phases = ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self._phases.items() if phase != "total")
+        self._logger.info(f"First frame on the panel {total * 1000:.0f} ms after launch ({phases})")
+
+
+STARTUP = StartupTimer()
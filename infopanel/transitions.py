@@ -0,0 +1,65 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class Transition(ABC):
+    # Composites the frame of the outgoing widget with the live frame of the incoming one.
+    # All buffers are allocated up front, so running a transition allocates nothing per frame.
+
+    def __init__(self, outgoing: np.ndarray, duration: float):
+        self._outgoing = outgoing
+        self._duration = duration
+        self._buffer = np.empty_like(outgoing)
+
+    @property
+    def duration(self) -> float:
+        return self._duration
+
+    def composite(self, incoming: np.ndarray, progress: float) -> np.ndarray:
+        self._compose(incoming, min(max(progress, 0.0), 1.0), self._buffer)
+        return self._buffer
+
+    @abstractmethod
+    def _compose(self, incoming: np.ndarray, progress: float, out: np.ndarray):
+        raise NotImplementedError("Subclasses must implement _compose() method")
+
+
+class Crossfade(Transition):
+    def __init__(self, outgoing: np.ndarray, duration: float):
+        super().__init__(outgoing, duration)
+        self._incoming_scaled = np.empty(outgoing.shape, dtype=np.uint16)
+        self._outgoing_scaled = np.empty(outgoing.shape, dtype=np.uint16)
+
+    def _compose(self, incoming: np.ndarray, progress: float, out: np.ndarray):
+        # Fixed point blend: (incoming * alpha + outgoing * (256 - alpha)) / 256
+        alpha = round(progress * 256)
+        np.multiply(incoming, alpha, out=self._incoming_scaled, dtype=np.uint16)
+        np.multiply(self._outgoing, 256 - alpha, out=self._outgoing_scaled, dtype=np.uint16)
+        self._incoming_scaled += self._outgoing_scaled
+        self._incoming_scaled >>= 8
+        np.copyto(out, self._incoming_scaled, casting="unsafe")
+
+
+class Slide(Transition):
+    def _compose(self, incoming: np.ndarray, progress: float, out: np.ndarray):
+        # The incoming frame pushes the outgoing one out to the left
+        width = out.shape[1]
+        shift = round(progress * width)
+        out[:, : width - shift] = self._outgoing[:, shift:]
+        out[:, width - shift :] = incoming[:, :shift]
+
+
+class Wipe(Transition):
+    def _compose(self, incoming: np.ndarray, progress: float, out: np.ndarray):
+        # The incoming frame is uncovered from left to right
+        edge = round(progress * out.shape[1])
+        out[:, :edge] = incoming[:, :edge]
+        out[:, edge:] = self._outgoing[:, edge:]
+
+
+TRANSITIONS: dict[str, type[Transition]] = {
+    "crossfade": Crossfade,
+    "slide": Slide,
+    "wipe": Wipe,
+}
@@ -1,8 +1,18 @@
+from importlib import import_module
+
 from .base import Widget as Widget
-from .hafas_timetable import HafasTimetable as HafasTimetable
-from .text import TextWidget as TextWidget
 
+# Widgets are imported on first use, so only the types in the config load their libraries (requests, zoneinfo, ...)
 WIDGETS = {
-    "hafas_timetable": HafasTimetable,
-    "text": TextWidget,
+    "hafas_timetable": "hafas_timetable:HafasTimetable",
+    "text": "text:TextWidget",
 }
+
+
+def get_widget_class(name: str) -> type[Widget] | None:
+    if name not in WIDGETS:
+        return None
+
+    module_name, class_name = WIDGETS[name].split(":")
+    module = import_module(f".{module_name}", __name__)
+    return getattr(module, class_name)
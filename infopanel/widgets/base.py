@@ -1,9 +1,13 @@
+import asyncio
 import logging
 import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Callable
+from collections.abc import Callable, Coroutine
+from concurrent.futures import Future
 
 from ..ledpanel import LEDPanel
+from ..runtime import AsyncRuntime
 
 
 class Widget(ABC):
@@ -12,11 +16,20 @@ class Widget(ABC):
         self._logger = logging.getLogger(self.__class__.__name__)
 
         self._render_requested = False
+        self._render_deadline: float | None = None  # Monotonic time of a scheduled render
+        self._render_listener: Callable[[Widget], None] | None = None
 
         self._running = False
         self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._async_wake_event = asyncio.Event()
         self._background_threads: list[threading.Thread] = []
 
+        # Coroutine variants of the background work, used instead of the threads when an asyncio runtime is attached
+        self._runtime: AsyncRuntime | None = None
+        self._background_tasks: list[tuple[Callable[..., Coroutine], tuple, dict]] = []
+        self._task_futures: list[Future] = []
+
     @property
     def params(self):
         return self._params
@@ -25,15 +38,46 @@ class Widget(ABC):
     def render_requested(self):
         return self._render_requested
 
+    @property
+    def render_deadline(self) -> float | None:
+        return self._render_deadline
+
     @property
     def running(self):
         return self._running
 
+    def set_render_listener(self, listener: Callable[[Widget], None] | None):
+        self._render_listener = listener
+
     def request_render(self):
         self._render_requested = True
 
-    def clear_render_request(self):
+        # Wake up whoever is waiting for this widget to render
+        listener = self._render_listener
+        if listener is not None:
+            listener(self)
+
+    def request_render_in(self, delay: float):
+        # Schedules a render, the earliest of several scheduled renders wins
+        deadline = time.monotonic() + delay
+        if self._render_deadline is not None and self._render_deadline <= deadline:
+            return
+        self._render_deadline = deadline
+
+        # Wake up the scheduler, so it can take the new deadline into account
+        listener = self._render_listener
+        if listener is not None:
+            listener(self)
+
+    def clear_render_request(self, keep_deadline: bool = False):
         self._render_requested = False
+        if not keep_deadline:
+            self._render_deadline = None
+
+    def view_state(self) -> object | None:
+        # A cheap fingerprint of what render() would draw, compared with == to the one of the last frame.
+        # While it stays the same, requested renders are skipped. None means unknown, so the widget is always rendered.
+        return None
 
     def register_background_thread(self, target: Callable, *args, **kwargs):
         if self._running:
@@ -43,22 +87,80 @@ class Widget(ABC):
         thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
         self._background_threads.append(thread)
 
+    def register_background_task(self, target: Callable[..., Coroutine], *args, **kwargs):
+        if self._running:
+            raise RuntimeError("Background tasks must be registered before the widget is started")
+
+        self._logger.info(f"Registering background task: {target.__name__}")
+        self._background_tasks.append((target, args, kwargs))
+
+    def attach_runtime(self, runtime: AsyncRuntime | None):
+        if self._running:
+            raise RuntimeError("The runtime must be attached before the widget is started")
+
+        self._runtime = runtime
+
+    def sleep(self, seconds: float) -> bool:
+        # Sleeps in a background thread, returns early on wake() and returns False once the widget is stopped
+        self._wake_event.wait(seconds)
+        self._wake_event.clear()
+        return self._running
+
+    async def sleep_async(self, seconds: float):
+        # Same as sleep() for background tasks, which are cancelled when the widget is stopped
+        try:
+            async with asyncio.timeout(seconds):
+                await self._async_wake_event.wait()
+        except TimeoutError:
+            pass
+        self._async_wake_event.clear()
+
+    def wake(self):
+        # Cuts the current (or next) sleep of the background work short
+        self._wake_event.set()
+
+        loop = self._runtime.loop if self._runtime is not None else None
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._async_wake_event.set)
+
+    def warm(self):
+        # Called a while before the widget is shown, so it can refresh its data in time
+        self.wake()
+
     def start(self):
         self._logger.info("Starting widget...")
         self.setup()
 
         self._running = True
-        for thread in self._background_threads:
-            thread.start()
+        self._wake_event.clear()
+
+        if self._runtime is not None and self._background_tasks:
+            for target, args, kwargs in self._background_tasks:
+                self._task_futures.append(self._runtime.spawn(target(*args, **kwargs)))
+        else:
+            for thread in self._background_threads:
+                thread.start()
 
     def stop(self):
         self._logger.info("Stopping widget...")
         self._running = False
+        self._wake_event.set()
+
+        # Tasks are cancelled at their next await, threads return from sleep() right away
+        for future in self._task_futures:
+            future.cancel()
+        self._task_futures = []
+
         for thread in self._background_threads:
-            thread.join(timeout=5)
+            if thread.is_alive():
+                thread.join(timeout=5)
 
         self.teardown()
 
+    def update_params(self, **params) -> bool:
+        # Applies new params to the running widget, returns False if it has to be recreated for them instead
+        return False
+
     def setup(self):
         pass
 
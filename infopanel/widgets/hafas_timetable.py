@@ -1,200 +1,16 @@
+import re
 import time
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Literal
 from zoneinfo import ZoneInfo
 
-import requests
-from requests.adapters import HTTPAdapter, Retry
-
+from ..hafas import Departure, Him, Location, PollingPolicy, get_shared_api, get_shared_async_api, line_names
 from ..ledpanel import LEDPanel
+from ..metrics import METRICS
 from .base import Widget
 
 
-@dataclass
-class Location:
-    id: str
-    name: str
-
-    @staticmethod
-    def from_hafas(loc: dict):
-        return Location(
-            id=loc["lid"],
-            name=loc["name"].replace("(Berlin)", "").strip(),
-        )
-
-
-@dataclass
-class Departure:
-    id: str
-    name: str
-    direction: str
-    cancelled: bool = False
-    minutes: int = 0
-
-    @staticmethod
-    def from_hafas(dep: dict, common: dict, now_minutes: int = 0):
-        id = dep["jid"]
-        name = common["prodL"][dep["prodX"]]["name"]
-        direction = dep["dirTxt"].replace("(Berlin)", "").strip()
-        cancelled = dep["stbStop"].get("dCncl", False)
-
-        # Calculate minutes until departure
-        timestamp = dep["stbStop"].get("dTimeR", dep["stbStop"]["dTimeS"])
-        departure_minutes = hafas_timestamp_to_minutes(timestamp)
-        minutes = departure_minutes - now_minutes
-
-        # Account for day-shift
-        if minutes >= 12 * 60:
-            minutes -= 24 * 60
-
-        return Departure(
-            id=id,
-            name=name,
-            direction=direction,
-            cancelled=cancelled,
-            minutes=minutes,
-        )
-
-
-@dataclass
-class Him:
-    id: str
-    title: str
-    body: str
-
-    @staticmethod
-    def from_hafas(h: dict) -> "Him":
-        return Him(
-            id=h["hid"],
-            title=h["head"],
-            body=h["text"],
-        )
-
-
-def hafas_timestamp_to_minutes(ts: str):
-    if len(ts) == 8:
-        days = int(ts[0:2])
-        ts = ts[2:]
-    else:
-        days = 0
-
-    hours = int(ts[0:2])
-    minutes = int(ts[2:4])
-    _seconds = int(ts[4:6])
-
-    return days * 24 * 60 + hours * 60 + minutes
-
-
-class HafasAPI:
-    ENDPOINT = "https://bvg-apps-ext.hafas.de/gate"
-    BODY = {
-        "id": "724muxsmmmsph34k",
-        "ver": "1.72",
-        "lang": "deu",
-        "auth": {
-            "type": "AID",
-            "aid": "dVg4TZbW8anjx9ztPwe2uk4LVRi9wO",
-        },
-        "client": {
-            "id": "VBB",
-            "type": "WEB",
-            "name": "webapp",
-            "l": "vs_webapp",
-            "v": 10004,
-        },
-        "formatted": False,
-    }
-    USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:147.0) Gecko/20100101 Firefox/147.0"
-
-    def __init__(self):
-        self.session = requests.Session()
-        retries = Retry(
-            total=5,
-            backoff_factor=0.1,
-            status_forcelist=[500, 502, 503, 504],
-        )
-        self.session.mount("https://", HTTPAdapter(max_retries=retries))
-
-    def request(self, data: dict):
-        body = {
-            **self.BODY,
-            "svcReqL": [data],
-        }
-
-        res = self.session.post(self.ENDPOINT, json=body, headers={"User-Agent": self.USER_AGENT})
-        res.raise_for_status()
-
-        return res.json()
-
-    def search_location(self, query: str) -> Location | None:
-        res = self.request({
-            "meth": "LocMatch",
-            "req": {
-                "input": {
-                    "field": "S",
-                    "loc": {
-                        "name": query,
-                        "type": "S",
-                    },
-                },
-            },
-        })
-
-        locations = res["svcResL"][0]["res"]["match"]["locL"]
-        if not locations:
-            return None
-
-        location = locations[0]
-        return Location.from_hafas(location)
-
-    def list_departures(
-        self,
-        now_minutes: int,
-        location_id: str,
-        lines: list[str] | None = None,
-        top: int = 10,
-    ) -> tuple[list[Departure], list[Him]]:
-        res = self.request({
-            "meth": "StationBoard",
-            "req": {
-                "jnyFltrL": [
-                    {
-                        "type": "PROD",
-                        "mode": "INC",
-                        "value": 127,
-                    },
-                ],
-                "stbLoc": {
-                    "lid": location_id,
-                },
-                "type": "DEP",
-                "sort": "PT",
-                "maxJny": top,
-            },
-        })
-
-        common = res["svcResL"][0]["res"]["common"]
-
-        hafas_departures = res["svcResL"][0]["res"]["jnyL"]
-        departures = [Departure.from_hafas(d, common, now_minutes) for d in hafas_departures]
-
-        # remove past or cancelled departures and sort by time till departures
-        departures = [d for d in departures if not d.cancelled and d.minutes > 0]
-        departures.sort(key=lambda d: d.minutes)
-
-        # filter by lines
-        if lines is not None:
-            departures = [d for d in departures if d.name.strip() in lines]
-
-        # Get unique hims
-        hafas_hims = common.get("himL", [])
-        hafas_hims = list({him["hid"]: him for him in hafas_hims}.values())
-        hims = [Him.from_hafas(h) for h in hafas_hims]
-
-        return departures, hims
-
-
 @dataclass
 class HafasTimetable(Widget):
     def __init__(
@@ -203,76 +19,227 @@ class HafasTimetable(Widget):
         timezone: str = "UTC",
         lines: list[str] | None = None,
         refresh_interval: int = 10,
+        max_refresh_interval: int = 300,
+        scroll_speed: int = 20,
+        scroll_directions: bool = False,
     ):
         super().__init__(
             location=location,
             timezone=timezone,
             lines=lines,
             refresh_interval=refresh_interval,
+            max_refresh_interval=max_refresh_interval,
+            scroll_speed=scroll_speed,
+            scroll_directions=scroll_directions,
         )
 
+        # Poll every refresh_interval while departures are imminent or changing, back off while the board is quiet
+        self._polling = PollingPolicy(base_interval=refresh_interval, max_interval=max_refresh_interval)
+        self._refresh_interval: float | None = None
+
         # Store the timezone info
         self._timezone = ZoneInfo(timezone)
 
-        # Create the Hafas API
-        self._api = HafasAPI()
+        # Use the process-wide Hafas API, so widgets showing the same station share their requests
+        self._api = get_shared_api()
 
         # Search for the provided location
         self._status: Literal["loading", "error", "ready"] = "loading"
         self._location: Location | None = None
         self._departures: list[Departure] = []
         self._hims: list[Him] = []
+        self._fetch_time: float | None = None  # Monotonic time of the last successful fetch
+
+        # Marquees (the disruption ticker and long directions) scroll by scroll_speed pixels per second from here
+        self._scroll_start = time.monotonic()
+        self._ticker: tuple[list[Him], str] = ([], "")
+        self._scrolling = False  # Whether the last frame had a marquee that actually scrolls
+
+        # Fetches as the widget sees them, answered from the shared cache or not
+        self._fetch_time_metric = METRICS.histogram("infopanel_fetch_seconds", "Time to fetch a departure board", station=location)
+        self._fetch_errors = METRICS.counter("infopanel_fetch_errors", "Failed departure board fetches", station=location)
 
         self.register_background_thread(self._fetch_loop)
+        self.register_background_task(self._fetch_loop_async)
 
-    def _current_minutes(self) -> int:
-        now = datetime.now(self._timezone)
-        return now.hour * 60 + now.minute
+    def update_params(
+        self,
+        location: str,
+        timezone: str = "UTC",
+        lines: list[str] | None = None,
+        refresh_interval: int = 10,
+        max_refresh_interval: int = 300,
+        scroll_speed: int = 20,
+        scroll_directions: bool = False,
+    ) -> bool:
+        # Another station needs another location search, everything else applies to the fetched board
+        if location != self._params["location"] or timezone != self._params["timezone"]:
+            return False
+
+        params = self._params
+        refetch = lines != params["lines"]
+        if refresh_interval != params["refresh_interval"] or max_refresh_interval != params["max_refresh_interval"]:
+            self._polling = PollingPolicy(base_interval=refresh_interval, max_interval=max_refresh_interval)
+            refetch = True
 
-    def _fetch_loop(self):
-        # Fetch location
-        self._logger.debug(f"Searching for location '{self._params['location']}'...")
         with self._lock:
-            self._status = "loading"
+            params.update(
+                lines=lines,
+                refresh_interval=refresh_interval,
+                max_refresh_interval=max_refresh_interval,
+                scroll_speed=scroll_speed,
+                scroll_directions=scroll_directions,
+            )
+            # Drop the lines that aren't shown anymore right away, new ones come with the next fetch
+            if lines is not None:
+                names = line_names(lines)
+                self._departures = [d for d in self._departures if d.name in names]
+
+        if refetch:
+            self.wake()
+        self.request_render()
+        return True
 
-        location = self._api.search_location(self._params["location"])
+    @staticmethod
+    def _ticker_text(hims: list[Him]) -> str:
+        # Messages may contain some HTML, the panel only shows plain text
+        messages = [re.sub(r"\s+", " ", re.sub(r"<[^>]*>", " ", f"{him.title}: {him.body}")).strip() for him in hims]
+        return "  +++  ".join(messages)
+
+    def warm(self):
+        # Refresh early only if the board is older than the base interval, the polling policy takes care of the rest
+        fetch_time = self._fetch_time
+        if fetch_time is None or time.monotonic() - fetch_time > self._params["refresh_interval"]:
+            self.wake()
+
+    def show(self):
+        self._scroll_start = time.monotonic()
+
+    def _next_refresh_interval(self, departures: list[Departure] | None, now: datetime) -> float:
+        if departures is None:
+            interval, reason = self._polling.on_error()
+        else:
+            interval, reason = self._polling.on_success(departures, now)
+
+        # Only changes of the interval are worth an info line, the board is polled quite often otherwise
+        log = self._logger.info if interval != self._refresh_interval else self._logger.debug
+        log(f"Next refresh in {interval:.0f}s: {reason}")
+        self._refresh_interval = interval
+
+        return interval
+
+    def _set_location(self, location: Location | None) -> Location:
         if location is None:
             raise ValueError(f"Location '{self._params['location']}' not found")
 
         with self._lock:
             self._location = location
+        return location
+
+    def _fetch_loop(self):
+        with self._lock:
+            self._status = "loading"
 
         while self._running:
+            now = datetime.now(self._timezone)
+            departures = None
             try:
+                # The location is searched on the first fetch, a failed search is retried like a failed fetch
+                location = self._location
+                if location is None:
+                    self._logger.debug(f"Searching for location '{self._params['location']}'...")
+                    location = self._set_location(self._api.search_location(self._params["location"]))
+
                 # Fetch departures and hims
-                self._logger.debug(f"Fetching departures for location '{self._location.name}'...")
-                now_minutes = self._current_minutes()
+                self._logger.debug(f"Fetching departures for location '{location.name}'...")
+                start = time.perf_counter()
                 departures, hims = self._api.list_departures(
-                    now_minutes=now_minutes,
-                    location_id=self._location.id,
+                    now=now,
+                    location_id=location.id,
                     lines=self._params["lines"],
                     top=50,
                 )
+                self._fetch_time_metric.observe(time.perf_counter() - start)
 
                 with self._lock:
                     self._status = "ready"
                     self._departures = departures
                     self._hims = hims
-            except Exception as e:
+                    self._fetch_time = time.monotonic()
+            except Exception as e:  # noqa: BLE001
+                # Whatever fails only shows as an error on the board, the next poll may well succeed
                 self._logger.error(f"Error fetching departures: {e}")
+                self._fetch_errors.inc()
                 with self._lock:
                     self._status = "error"
             finally:
                 # Schedule next refresh
                 self.request_render()
-                time.sleep(self._params["refresh_interval"])
+                self.sleep(self._next_refresh_interval(departures, now))
+
+    async def _fetch_loop_async(self):
+        # Same as _fetch_loop, but runs on the asyncio runtime and is cancelled when the widget stops
+        api = get_shared_async_api()
+
+        with self._lock:
+            self._status = "loading"
+
+        while self._running:
+            now = datetime.now(self._timezone)
+            departures = None
+            try:
+                location = self._location
+                if location is None:
+                    self._logger.debug(f"Searching for location '{self._params['location']}'...")
+                    location = self._set_location(await api.search_location(self._params["location"]))
+
+                self._logger.debug(f"Fetching departures for location '{location.name}'...")
+                start = time.perf_counter()
+                departures, hims = await api.list_departures(
+                    now=now,
+                    location_id=location.id,
+                    lines=self._params["lines"],
+                    top=50,
+                )
+                self._fetch_time_metric.observe(time.perf_counter() - start)
+
+                with self._lock:
+                    self._status = "ready"
+                    self._departures = departures
+                    self._hims = hims
+                    self._fetch_time = time.monotonic()
+            except Exception as e:  # noqa: BLE001
+                # Whatever fails only shows as an error on the board, the next poll may well succeed
+                self._logger.error(f"Error fetching departures: {e}")
+                self._fetch_errors.inc()
+                with self._lock:
+                    self._status = "error"
+
+            # Not in a finally block, awaiting there would swallow the cancellation
+            self.request_render()
+            await self.sleep_async(self._next_refresh_interval(departures, now))
+
+    def _now(self) -> datetime:
+        # Wall clock time the board is rendered for
+        return datetime.now(self._timezone)
+
+    def view_state(self) -> object | None:
+        # The fetched data, the clock minute and, while a marquee scrolls, its offset. A fetch that brings
+        # back the same board leaves it unchanged, so the scheduler doesn't redraw (and swap) an identical frame.
+        with self._lock:
+            state = (self._status, self._location, tuple(self._departures), tuple(self._hims))
+
+        scroll_offset = None
+        if self._scrolling:
+            scroll_offset = int((time.monotonic() - self._scroll_start) * self._params["scroll_speed"])
+
+        return state, int(self._now().timestamp() // 60), scroll_offset
 
     def render(self, panel: LEDPanel, delta_time: float):
         font = "regular"
         color = (255, 128, 0)
 
-        panel.clear()
-
+        # Every element is drawn with a key, so the panel only redraws the elements that changed
         # Draw loading or error state if needed
         with self._lock:
             status = self._status
@@ -286,11 +253,17 @@ class HafasTimetable(Widget):
                 color=color,
                 halign="center",
                 valign="center",
+                key="status",
             )
+            self._scrolling = False
             return
 
         # Draw a clock
-        now = datetime.now(self._timezone)
+        now = self._now()
+
+        # Render again when the minute changes, that's when the clock and all countdowns change
+        self.request_render_in(60 - now.second - now.microsecond / 1e6)
+
         time_str = now.strftime("%H:%M")
         clock_x, _, _, _ = panel.draw_text(
             text=time_str,
@@ -300,6 +273,7 @@ class HafasTimetable(Widget):
             color=color,
             halign="right",
             valign="top",
+            key="clock",
         )
 
         # Draw the location
@@ -314,15 +288,44 @@ class HafasTimetable(Widget):
             color=color,
             halign="left",
             valign="top",
+            key="location",
         )
 
-        # Draw each departure
-        max_departures = panel.height // panel.line_height(font) - 1
         with self._lock:
-            departures = self._departures[:max_departures]
+            departures = self._departures
+            hims = self._hims
+
+        # Active disruption messages scroll by in the bottom row
+        line_height = panel.line_height(font)
+        scroll_offset = int((time.monotonic() - self._scroll_start) * self._params["scroll_speed"])
+        scrolling = False
+
+        # The ticker text only changes when new messages were fetched
+        if self._ticker[0] is not hims:
+            self._ticker = (hims, self._ticker_text(hims))
+        ticker = self._ticker[1]
+        if ticker:
+            panel.draw_marquee(
+                text=ticker,
+                x=0,
+                y=panel.height - line_height,
+                width=panel.width,
+                offset=scroll_offset,
+                font=font,
+                color=color,
+                valign="top",
+                key="ticker",
+            )
+            scrolling = panel.supports_marquees and panel.line_width(font, ticker) > panel.width
+
+        # Draw each departure
+        max_departures = panel.height // line_height - 1 - (1 if ticker else 0)
+
+        # Count down locally between fetches, and drop departures that have left since the last one
+        countdowns = [(d, minutes) for d in departures if (minutes := d.minutes_until(now)) > 0][:max_departures]
 
-        for i, departure in enumerate(departures):
-            y = (i + 1) * panel.line_height(font)
+        for i, (departure, minutes) in enumerate(countdowns):
+            y = (i + 1) * line_height
 
             # Departure line name
             panel.draw_text(
@@ -333,31 +336,53 @@ class HafasTimetable(Widget):
                 color=color,
                 halign="left",
                 valign="top",
+                key=f"departure{i}.name",
             )
 
             # Departure line direction/destination
             direction_x = 22
             direction_max_width = panel.width - direction_x - 15
-            panel.draw_text(
-                text=departure.direction,
-                x=direction_x,
-                y=y,
-                font=font,
-                color=color,
-                halign="left",
-                valign="top",
-                max_width=direction_max_width,
-                ellipsis="...",
-            )
+            if self._params["scroll_directions"]:
+                panel.draw_marquee(
+                    text=departure.direction,
+                    x=direction_x,
+                    y=y,
+                    width=direction_max_width,
+                    offset=scroll_offset,
+                    font=font,
+                    color=color,
+                    valign="top",
+                    key=f"departure{i}.direction",
+                )
+                scrolling = scrolling or (panel.supports_marquees and panel.line_width(font, departure.direction) > direction_max_width)
+            else:
+                panel.draw_text(
+                    text=departure.direction,
+                    x=direction_x,
+                    y=y,
+                    font=font,
+                    color=color,
+                    halign="left",
+                    valign="top",
+                    max_width=direction_max_width,
+                    ellipsis="...",
+                    key=f"departure{i}.direction",
+                )
 
             # Departure time till departure
-            minutes = max(0, min(99, departure.minutes))
             panel.draw_text(
-                text=f"{minutes}'",
+                text=f"{min(99, minutes)}'",
                 x=panel.width - 1,
                 y=y,
                 font=font,
                 color=color,
                 halign="right",
                 valign="top",
+                key=f"departure{i}.minutes",
             )
+
+        # Render again as soon as the marquees have moved by a pixel. Backends without sprites draw them
+        # truncated, there is nothing to move.
+        self._scrolling = scrolling
+        if scrolling:
+            self.request_render_in(1 / self._params["scroll_speed"])
@@ -0,0 +1,239 @@
+import logging
+import multiprocessing
+import threading
+import time
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from ..config import CONFIG
+from ..ledpanel import LEDPanel
+from .base import Widget
+
+
+class ProcessWidget(Widget):
+    # Hosts a widget in a worker process. The worker fetches and renders with its own interpreter (and GIL) on
+    # another core and publishes its frames in shared memory, the main process only copies the latest one onto the panel.
+
+    def __init__(self, widget_type: str, params: dict, width: int, height: int, update_rate: float = 1 / 30):
+        super().__init__(widget_type=widget_type, params=params)
+        self._width = width
+        self._height = height
+        self._update_rate = update_rate
+
+        # Spawned rather than forked, forking a process that runs the matrix refresh and fetch threads isn't safe
+        self._context = multiprocessing.get_context("spawn")
+        self._frame_lock = self._context.Lock()
+        self._shared: SharedMemory | None = None
+        self._frame: np.ndarray | None = None
+        self._connection: Connection | None = None
+        self._process: multiprocessing.process.BaseProcess | None = None
+
+        # Set once the worker was asked to stop, it closing the pipe is expected from then on
+        self._stopping = False
+
+        # Frames published by the worker, the shared frame only changes when this does
+        self._frames_published = 0
+
+        self.register_background_thread(self._listen)
+
+    def setup(self):
+        self._stopping = False
+        self._shared = SharedMemory(create=True, size=self._width * self._height * 3)
+        self._frame = np.ndarray((self._height, self._width, 3), dtype=np.uint8, buffer=self._shared.buf)
+        self._frame.fill(0)
+
+        self._connection, worker_connection = self._context.Pipe()
+        self._process = self._context.Process(
+            target=run_worker,
+            args=(
+                self._params["widget_type"],
+                self._params["params"],
+                self._width,
+                self._height,
+                self._update_rate,
+                self._shared.name,
+                self._frame_lock,
+                worker_connection,
+                logging.getLogger().level,
+                CONFIG,
+            ),
+            name=f"{self._params['widget_type']} worker",
+            daemon=True,
+        )
+        self._process.start()
+        worker_connection.close()
+
+    def _send(self, command: str):
+        if self._connection is None:
+            return
+
+        try:
+            self._connection.send(command)
+        except OSError:
+            # The worker is gone, the listener reports why
+            pass
+
+    def _listen(self):
+        # Every frame the worker publishes is rendered (copied onto the panel) by the scheduler
+        assert self._connection is not None
+        while True:
+            try:
+                message = self._connection.recv()
+            except (EOFError, OSError) as e:
+                if not self._stopping:
+                    self._logger.error(f"Worker process exited unexpectedly: {e or 'connection closed'}")
+                return
+
+            if message == "frame":
+                self._frames_published += 1
+                self.request_render()
+
+    def warm(self):
+        self._send("warm")
+
+    def show(self):
+        self._send("show")
+
+    def hide(self):
+        self._send("hide")
+
+    def stop(self):
+        # Ask the worker to stop first, the listener thread returns once the worker closes its end of the pipe
+        self._stopping = True
+        self._send("stop")
+        super().stop()
+
+    def teardown(self):
+        if self._process is not None:
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._logger.warning("Worker process did not stop, terminating it")
+                self._process.terminate()
+            self._process = None
+
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+        if self._shared is not None:
+            self._frame = None
+            self._shared.close()
+            self._shared.unlink()
+            self._shared = None
+
+    def view_state(self) -> object | None:
+        return self._frames_published
+
+    def render(self, panel: LEDPanel, delta_time: float):
+        if self._frame is None:
+            return
+
+        with self._frame_lock:
+            panel.draw_frame(self._frame)
+
+
+def run_worker(
+    widget_type: str,
+    params: dict,
+    width: int,
+    height: int,
+    update_rate: float,
+    shared_name: str,
+    frame_lock,
+    connection: Connection,
+    log_level: int,
+    config: dict,
+):
+    # Entry point of the worker process: runs the widget and renders it whenever it asks for it, like the scheduler does
+    from . import get_widget_class
+
+    logging.basicConfig(level=log_level)
+    logger = logging.getLogger(f"{widget_type} worker")
+
+    # Spawned workers start with an empty config, the widgets' shared clients (like the HAFAS one) read theirs from it
+    CONFIG.update(config)
+
+    widget_class = get_widget_class(widget_type)
+    if widget_class is None:
+        raise ValueError(f"Unknown widget type: {widget_type}")
+
+    panel = LEDPanel({"cols": width, "rows": height, "backend": "headless"})
+    panel.initialize()
+
+    # The main process owns (and unlinks) the shared memory, the worker only attaches to it
+    shared = SharedMemory(name=shared_name, track=False)
+    frame = np.ndarray((height, width, 3), dtype=np.uint8, buffer=shared.buf)
+
+    widget = widget_class(**params)
+    wakeup = threading.Event()
+    stopped = threading.Event()
+    widget.set_render_listener(lambda _: wakeup.set())
+
+    def receive():
+        while True:
+            try:
+                command = connection.recv()
+            except EOFError:
+                command = "stop"
+
+            if command == "stop":
+                stopped.set()
+                wakeup.set()
+                return
+            elif command == "show":
+                widget.show()
+                widget.request_render()
+            elif command == "hide":
+                widget.hide()
+            elif command == "warm":
+                widget.warm()
+
+    threading.Thread(target=receive, name="receive", daemon=True).start()
+
+    widget.start()
+    widget.request_render()
+
+    last_render_time = 0.0
+    last_view_state = None
+    try:
+        while not stopped.is_set():
+            wakeup.clear()
+            now = time.monotonic()
+
+            timeout = None
+            render_deadline = widget.render_deadline
+            if widget.render_requested or (render_deadline is not None and render_deadline <= now):
+                next_render_time = last_render_time + update_rate
+                if now >= next_render_time:
+                    # Nothing new to publish while the view state stays the same, scheduled renders always happen
+                    view_state = widget.view_state()
+                    due = render_deadline is not None and render_deadline <= now
+                    if not due and view_state is not None and view_state == last_view_state:
+                        widget.clear_render_request(keep_deadline=True)
+                        continue
+
+                    widget.clear_render_request()
+                    widget.render(panel, now - last_render_time)
+                    panel.swap()
+                    last_render_time = now
+                    last_view_state = view_state
+
+                    with frame_lock:
+                        panel.copy_frame(frame)
+                    connection.send("frame")
+                    continue
+
+                timeout = next_render_time - now
+            elif render_deadline is not None:
+                timeout = render_deadline - now
+
+            wakeup.wait(timeout)
+    except (BrokenPipeError, KeyboardInterrupt) as e:
+        logger.debug(f"Stopping worker: {e!r}")
+    finally:
+        widget.stop()
+        del frame
+        shared.close()
+        connection.close()
@@ -9,11 +9,17 @@ class TextWidget(Widget):
     def __init__(self, text: str = "Hello, World!"):
         super().__init__(text=text)
 
+    def update_params(self, text: str = "Hello, World!") -> bool:
+        self._params["text"] = text
+        self.request_render()
+        return True
+
+    def view_state(self) -> object | None:
+        return self._params["text"]
+
     def render(self, panel: LEDPanel, delta_time: float):
         font = "regular"
 
-        panel.clear()
-
         text = self._params["text"]
         lines = text.splitlines()
 
@@ -32,4 +38,5 @@ class TextWidget(Widget):
                 color=(255, 255, 255),
                 halign="center",
                 valign="center",
+                key=f"line{i}",
             )
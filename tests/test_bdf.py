@@ -0,0 +1,144 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from infopanel.bdf import CACHE_SUFFIX, BDFFont
+from infopanel.font import REPLACEMENT_CODEPOINT
+
+FONTS = Path(__file__).parent.parent / "infopanel" / "fonts"
+
+FONT = """\
+STARTFONT 2.1
+FONTBOUNDINGBOX 5 8 0 -1
+CHARS 5
+STARTCHAR A
+ENCODING 65
+DWIDTH 4 0
+BBX 3 2 1 0
+BITMAP
+E0
+A0
+ENDCHAR
+STARTCHAR narrow
+ENCODING 66
+DWIDTH 2 0
+BBX 4 1 0 -1
+BITMAP
+F0
+ENDCHAR
+STARTCHAR unencoded
+ENCODING -1
+DWIDTH 5 0
+BBX 1 1 0 0
+BITMAP
+80
+ENDCHAR
+STARTCHAR incomplete
+ENCODING 67
+DWIDTH 5 0
+BBX 1 2 0 0
+BITMAP
+80
+ENDCHAR
+STARTCHAR replacement
+ENCODING 65533
+DWIDTH 3 0
+BBX 1 1 0 0
+BITMAP
+80
+ENDCHAR
+ENDFONT
+"""
+
+
+def write_font(path: Path, text: str = FONT) -> Path:
+    path.write_text(text)
+    return path
+
+
+def glyph_rows(font: BDFFont, i: int) -> list[int]:
+    return list(font.rows[font.row_starts[i] : font.row_starts[i + 1]])
+
+
+def assert_same_font(a: BDFFont, b: BDFFont):
+    assert (a.height, a.baseline) == (b.height, b.baseline)
+    for name in ("codepoints", "advances", "tops", "row_starts", "rows"):
+        assert list(getattr(a, name)) == list(getattr(b, name)), name
+
+
+def test_parse(tmp_path: Path):
+    font = BDFFont.parse(write_font(tmp_path / "font.bdf"))
+
+    assert (font.height, font.baseline) == (8, 7)
+
+    # Glyphs without an encoding or with missing bitmap rows are skipped
+    assert list(font.codepoints) == [65, 66, REPLACEMENT_CODEPOINT]
+    assert list(font.advances) == [4, 2, 3]
+    assert list(font.tops) == [-2, 0, -1]
+
+    # Rows are left-aligned, moved by the x offset and cut off at the advance width
+    assert glyph_rows(font, 0) == [0x70000000, 0x50000000]
+    assert glyph_rows(font, 1) == [0xC0000000]
+
+
+def test_width_table_falls_back_to_the_replacement_glyph(tmp_path: Path):
+    widths = BDFFont.parse(write_font(tmp_path / "font.bdf")).width_table()
+
+    assert widths[65] == 4
+    assert widths[66] == 2
+    assert widths[67] == 3
+    assert widths[ord(" ")] == 3
+
+
+def test_parse_errors(tmp_path: Path):
+    with pytest.raises(BDFFont.ParseError):
+        BDFFont.parse(write_font(tmp_path / "no_bbox.bdf", FONT.replace("FONTBOUNDINGBOX 5 8 0 -1\n", "")))
+
+    with pytest.raises(BDFFont.ParseError):
+        BDFFont.parse(write_font(tmp_path / "bad_row.bdf", FONT.replace("A0\n", "XY\n")))
+
+
+def test_cache_hit_equals_fresh_parse(tmp_path: Path):
+    path = shutil.copy(FONTS / "tb-8.bdf", tmp_path / "tb-8.bdf")
+    parsed = BDFFont.load(path)
+
+    cache_path = path.with_suffix(CACHE_SUFFIX)
+    assert cache_path.exists()
+
+    cached = BDFFont.load_cache(cache_path, path.stat())
+    assert_same_font(cached, parsed)
+    assert_same_font(BDFFont.load(path), parsed)
+    assert list(cached.width_table()) == list(parsed.width_table())
+
+
+def test_stale_cache_is_invalidated(tmp_path: Path):
+    path = write_font(tmp_path / "font.bdf")
+    BDFFont.load(path)
+
+    # Drop the replacement glyph, the cache still holds it
+    write_font(path, FONT.replace("ENCODING 65533", "ENCODING -1"))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    with pytest.raises(ValueError):
+        BDFFont.load_cache(path.with_suffix(CACHE_SUFFIX), path.stat())
+
+    font = BDFFont.load(path)
+    assert list(font.codepoints) == [65, 66]
+
+    # The cache was rewritten for the new version
+    assert_same_font(BDFFont.load_cache(path.with_suffix(CACHE_SUFFIX), path.stat()), font)
+
+
+def test_truncated_cache_is_ignored(tmp_path: Path):
+    path = write_font(tmp_path / "font.bdf")
+    parsed = BDFFont.load(path)
+
+    cache_path = path.with_suffix(CACHE_SUFFIX)
+    cache_path.write_bytes(cache_path.read_bytes()[:40])
+
+    with pytest.raises(ValueError):
+        BDFFont.load_cache(cache_path, path.stat())
+    assert_same_font(BDFFont.load(path), parsed)
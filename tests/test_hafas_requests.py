@@ -0,0 +1,21 @@
+from infopanel.hafas.api import departures_request
+
+
+def line_filters(request: dict) -> list[dict]:
+    return [f for f in request["req"]["jnyFltrL"] if f["type"] == "LINE"]
+
+
+def test_no_line_filter_by_default():
+    assert line_filters(departures_request("A=1@L=1@", lines=["U2", "M45"])) == []
+
+
+def test_line_filter_sends_one_filter_per_line():
+    request = departures_request("A=1@L=1@", lines=[" U2", "M45", "U2 "], line_filter=True)
+    assert line_filters(request) == [
+        {"type": "LINE", "mode": "INC", "value": "M45"},
+        {"type": "LINE", "mode": "INC", "value": "U2"},
+    ]
+
+
+def test_line_filter_without_lines():
+    assert line_filters(departures_request("A=1@L=1@", line_filter=True)) == []
@@ -0,0 +1,84 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from infopanel.hafas import Departure, hafas_timestamp_to_datetime
+
+BERLIN = ZoneInfo("Europe/Berlin")
+
+
+def departure(date: str, ts: str) -> Departure:
+    return Departure(id="journey", name="U2", direction="Pankow", planned=hafas_timestamp_to_datetime(date, ts, BERLIN))
+
+
+@pytest.mark.parametrize(
+    ("ts", "expected"),
+    [
+        ("123456", datetime(2025, 1, 5, 12, 34, 56, tzinfo=BERLIN)),
+        ("00123456", datetime(2025, 1, 5, 12, 34, 56, tzinfo=BERLIN)),
+        ("01002500", datetime(2025, 1, 6, 0, 25, tzinfo=BERLIN)),
+        ("02013000", datetime(2025, 1, 7, 1, 30, tzinfo=BERLIN)),
+    ],
+)
+def test_day_offset(ts: str, expected: datetime):
+    assert hafas_timestamp_to_datetime("20250105", ts, BERLIN) == expected
+
+
+def test_day_offset_across_month_and_year():
+    assert hafas_timestamp_to_datetime("20251231", "01001500", BERLIN) == datetime(2026, 1, 1, 0, 15, tzinfo=BERLIN)
+
+
+def test_dst_start_offsets():
+    # Clocks go from 02:00 CET to 03:00 CEST on 2025-03-30
+    before = hafas_timestamp_to_datetime("20250330", "015500", BERLIN)
+    after = hafas_timestamp_to_datetime("20250330", "030500", BERLIN)
+
+    assert before.utcoffset().total_seconds() == 3600
+    assert after.utcoffset().total_seconds() == 7200
+    assert after.timestamp() - before.timestamp() == 10 * 60
+
+
+def test_dst_end_offsets():
+    # Clocks go from 03:00 CEST back to 02:00 CET on 2025-10-26
+    before = hafas_timestamp_to_datetime("20251026", "015000", BERLIN)
+    after = hafas_timestamp_to_datetime("20251026", "031000", BERLIN)
+
+    assert before.utcoffset().total_seconds() == 7200
+    assert after.utcoffset().total_seconds() == 3600
+    assert after.timestamp() - before.timestamp() == 140 * 60
+
+
+@pytest.mark.parametrize(
+    ("now", "expected"),
+    [
+        (datetime(2025, 1, 5, 12, 0, 0, tzinfo=BERLIN), 5),
+        (datetime(2025, 1, 5, 12, 0, 59, tzinfo=BERLIN), 5),
+        (datetime(2025, 1, 5, 12, 4, 30, tzinfo=BERLIN), 1),
+        (datetime(2025, 1, 5, 12, 5, 0, tzinfo=BERLIN), 0),
+        (datetime(2025, 1, 5, 12, 6, 0, tzinfo=BERLIN), -1),
+    ],
+)
+def test_minutes_until(now: datetime, expected: int):
+    assert departure("20250105", "120500").minutes_until(now) == expected
+
+
+def test_minutes_until_across_midnight():
+    now = datetime(2025, 1, 5, 23, 58, 40, tzinfo=BERLIN)
+    assert departure("20250105", "01000100").minutes_until(now) == 3
+
+
+def test_minutes_until_across_dst_start():
+    now = datetime(2025, 3, 30, 1, 55, 30, tzinfo=BERLIN)
+    assert departure("20250330", "030500").minutes_until(now) == 10
+
+
+def test_minutes_until_across_dst_end():
+    now = datetime(2025, 10, 26, 1, 50, 0, tzinfo=BERLIN)
+    assert departure("20251026", "031000").minutes_until(now) == 140
+
+
+def test_minutes_until_uses_realtime():
+    dep = departure("20250105", "120500")
+    dep.realtime = hafas_timestamp_to_datetime("20250105", "120800", BERLIN)
+    assert dep.minutes_until(datetime(2025, 1, 5, 12, 0, tzinfo=BERLIN)) == 8
@@ -0,0 +1,88 @@
+import random
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from infopanel.hafas import Departure, PollingPolicy
+
+NOW = datetime(2025, 1, 6, 12, 0, tzinfo=ZoneInfo("Europe/Berlin"))
+
+
+def departures(*minutes: int) -> list[Departure]:
+    return [Departure(id=f"journey-{i}", name="U2", direction="Pankow", planned=NOW + timedelta(minutes=m)) for i, m in enumerate(minutes)]
+
+
+def test_first_board_polls_at_base_interval():
+    policy = PollingPolicy(base_interval=10, max_interval=300)
+    interval, _ = policy.on_success(departures(30), NOW)
+    assert interval == 10
+
+
+def test_unchanged_board_backs_off():
+    policy = PollingPolicy(base_interval=10, max_interval=300)
+    board = departures(60)
+
+    intervals = [policy.on_success(board, NOW)[0] for _ in range(7)]
+    assert intervals == [10, 20, 40, 80, 160, 300, 300]
+
+
+def test_backoff_is_back_in_time_for_the_next_departure():
+    policy = PollingPolicy(base_interval=10, max_interval=300, imminent_minutes=3)
+    board = departures(5)
+
+    intervals = [policy.on_success(board, NOW)[0] for _ in range(5)]
+    assert intervals == [10, 20, 40, 80, 120]
+
+
+def test_changed_departure_times_reset_the_backoff():
+    policy = PollingPolicy(base_interval=10, max_interval=300)
+    for _ in range(4):
+        policy.on_success(departures(60), NOW)
+
+    delayed = departures(62)
+    assert policy.on_success(delayed, NOW)[0] == 10
+    assert policy.on_success(delayed, NOW)[0] == 20
+
+
+def test_imminent_departure_polls_at_base_interval():
+    policy = PollingPolicy(base_interval=10, max_interval=300, imminent_minutes=3)
+    board = departures(2)
+
+    intervals = [policy.on_success(board, NOW)[0] for _ in range(3)]
+    assert intervals == [10, 10, 10]
+
+
+def test_empty_board_polls_at_max_interval():
+    policy = PollingPolicy(base_interval=10, max_interval=300)
+    assert policy.on_success([], NOW)[0] == 300
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_error_backoff_stays_in_range(seed: int):
+    policy = PollingPolicy(base_interval=10, error_max_interval=300, rng=random.Random(seed))
+
+    for errors in range(1, 10):
+        interval, _ = policy.on_error()
+        assert 10 <= interval <= min(300, 10 * 2**errors)
+
+
+def test_success_resets_the_error_backoff():
+    policy = PollingPolicy(base_interval=10, error_max_interval=300, rng=random.Random(0))
+    for _ in range(8):
+        policy.on_error()
+
+    policy.on_success(departures(60), NOW)
+    for _ in range(20):
+        assert 10 <= policy.on_error()[0] <= 20
+        policy.on_success(departures(60), NOW)
+
+
+def test_error_resets_the_success_backoff():
+    policy = PollingPolicy(base_interval=10, max_interval=300, rng=random.Random(0))
+    board = departures(60)
+    for _ in range(4):
+        policy.on_success(board, NOW)
+
+    policy.on_error()
+    assert policy.on_success(board, NOW)[0] == 20
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from infopanel.backends.headless import HeadlessBackend
+from infopanel.bdf import BDFFont
+from infopanel.font import Font, FontMetrics
+
+FONTS = Path(__file__).parent.parent / "infopanel" / "fonts"
+COLOR = (255, 128, 0)
+
+# "Ag 3'" in the regular font with its baseline at y=7, as rgbmatrix draws it
+GOLDEN = """\
+........................
+.##..........####.#.....
+#..#...........#..#.....
+#..#..##......##..#.....
+####.#..#.......#.......
+#..#..###....#..#.......
+#..#....#.....##........
+......##................
+........................
+"""
+
+
+def load_font(name: str) -> Font:
+    path = FONTS / f"{name}.bdf"
+    atlas = BDFFont.load(path, use_cache=False)
+    return Font(name=name, path=path, atlas=atlas, metrics=FontMetrics.from_bdf(atlas))
+
+
+def draw(font: Font, width: int, height: int, x: int, y: int, text: str) -> np.ndarray:
+    backend = HeadlessBackend({"cols": width, "rows": height})
+    backend.initialize()
+    backend.draw_text(font, x, y, COLOR, text)
+    return backend.frame
+
+
+def to_text(frame: np.ndarray) -> str:
+    return "".join("".join("#" if pixel.any() else "." for pixel in row) + "\n" for row in frame)
+
+
+def test_golden_frame():
+    frame = draw(load_font("tb-8"), 24, 9, 0, 7, "Ag 3'")
+    assert to_text(frame) == GOLDEN
+    assert {tuple(pixel) for row in frame for pixel in row} == {(0, 0, 0), COLOR}
+
+
+class ReferenceCanvas:
+    # Records SetPixel calls like an rgbmatrix canvas, pixels outside of it are dropped
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def SetPixel(self, x: int, y: int, r: int, g: int, b: int):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.frame[y, x] = (r, g, b)
+
+
+@pytest.mark.parametrize("name", ["tb-8", "tb-8-bold"])
+@pytest.mark.parametrize(
+    ("x", "y", "text"),
+    [
+        (0, 7, "Hello, World!"),
+        (3, 12, "Äöüß 10' €"),
+        (0, 7, "S+U Zoologischer Garten"),
+        (-3, 7, "clipped left"),
+        (50, 7, "clipped right"),
+        (0, 3, "clipped top"),
+        (0, 15, "clipped bottom gjpqy"),
+        (0, 7, "missing 中 glyph"),
+    ],
+)
+def test_matches_draw_text(name: str, x: int, y: int, text: str):
+    # The emulator's glyph drawing mirrors rgbmatrix's, DrawText draws glyph after glyph with it
+    graphics = pytest.importorskip("RGBMatrixEmulator.graphics")
+    reference_font = graphics.Font()
+    reference_font.LoadFont((FONTS / f"{name}.bdf").as_posix())
+
+    canvas = ReferenceCanvas(64, 16)
+    color = graphics.Color(*COLOR)
+    pen = x
+    for char in text:
+        pen += reference_font.DrawGlyph(canvas, pen, y, color, ord(char))
+
+    assert np.array_equal(draw(load_font(name), 64, 16, x, y, text), canvas.frame)
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from infopanel.ledpanel import LEDPanel
+from infopanel.scheduler import Scheduler
+from infopanel.widgets.text import TextWidget
+
+
+def config(*texts: str) -> dict:
+    return {"widgets": [{"type": "text", "params": {"text": text}, "duration": 10} for text in texts]}
+
+
+@pytest.fixture
+def panel() -> LEDPanel:
+    panel = LEDPanel({"cols": 128, "rows": 64, "backend": "headless"})
+    panel.initialize()
+    return panel
+
+
+def reconfigure(scheduler: Scheduler, new_config: dict) -> list:
+    scheduler.reconfigure(new_config)
+    scheduler._apply_pending_config(time.monotonic())
+    return scheduler._widgets
+
+
+def texts(widgets: list) -> list[str]:
+    return [widget.params["text"] for widget in widgets]
+
+
+def test_unchanged_widgets_are_kept_when_moved(panel: LEDPanel):
+    scheduler = Scheduler(config("a", "b", "c"), panel)
+    a, b, c = scheduler._widgets
+
+    widgets = reconfigure(scheduler, config("c", "a", "b"))
+    assert widgets[0] is c and widgets[1] is a and widgets[2] is b
+
+
+def test_changed_params_are_applied_in_place(panel: LEDPanel):
+    scheduler = Scheduler(config("a", "b"), panel)
+    a, b = scheduler._widgets
+
+    widgets = reconfigure(scheduler, config("a", "x"))
+    assert widgets[0] is a and widgets[1] is b
+    assert texts(widgets) == ["a", "x"]
+
+
+def test_widgets_that_cant_take_new_params_are_replaced(panel: LEDPanel, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(TextWidget, "update_params", lambda self, **params: False)
+    scheduler = Scheduler(config("a", "b"), panel)
+    a, b = scheduler._widgets
+
+    widgets = reconfigure(scheduler, config("a", "x"))
+    assert widgets[0] is a
+    assert widgets[1] is not b
+    assert texts(widgets) == ["a", "x"]
+
+
+def test_added_and_removed_widgets(panel: LEDPanel):
+    scheduler = Scheduler(config("a", "b", "c"), panel)
+    a, b, c = scheduler._widgets
+
+    widgets = reconfigure(scheduler, config("b", "d"))
+    assert widgets[0] is b
+
+    # The new entry takes over one of the dropped widgets instead of creating another
+    assert widgets[1] is a or widgets[1] is c
+    assert texts(widgets) == ["b", "d"]
+
+
+def test_current_widget_stays_current(panel: LEDPanel):
+    scheduler = Scheduler(config("a", "b", "c"), panel)
+    scheduler._switch_widget(1)
+    current = scheduler.current_widget
+
+    reconfigure(scheduler, config("c", "b", "a", "d"))
+    assert scheduler.current_widget is current
+
+
+def test_invalid_config_keeps_the_widgets(panel: LEDPanel):
+    scheduler = Scheduler(config("a", "b"), panel)
+    a, b = scheduler._widgets
+
+    # Widgets compare equal, only their identity tells them apart
+    for invalid in ({"widgets": []}, {"widgets": [{"type": "unknown"}]}, {"widgets": [{"type": "text", "params": {"font": "bold"}}]}):
+        widgets = reconfigure(scheduler, invalid)
+        assert len(widgets) == 2 and widgets[0] is a and widgets[1] is b
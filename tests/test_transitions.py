@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from infopanel.transitions import TRANSITIONS, Crossfade, Slide, Wipe
+
+HEIGHT, WIDTH = 2, 8
+
+
+def frame(base: int) -> np.ndarray:
+    # Every column differs, so shifted or mixed up columns show
+    columns = np.arange(WIDTH, dtype=np.uint8) * 10 + base
+    return np.broadcast_to(columns[np.newaxis, :, np.newaxis], (HEIGHT, WIDTH, 3)).copy()
+
+
+OUTGOING = frame(100)
+INCOMING = frame(20)
+
+
+@pytest.mark.parametrize("name", TRANSITIONS)
+def test_start_shows_the_outgoing_frame(name: str):
+    transition = TRANSITIONS[name](OUTGOING.copy(), 0.5)
+    assert np.array_equal(transition.composite(INCOMING, 0.0), OUTGOING)
+    assert np.array_equal(transition.composite(INCOMING, -1.0), OUTGOING)
+
+
+@pytest.mark.parametrize("name", TRANSITIONS)
+def test_end_shows_the_incoming_frame(name: str):
+    transition = TRANSITIONS[name](OUTGOING.copy(), 0.5)
+    assert np.array_equal(transition.composite(INCOMING, 1.0), INCOMING)
+    assert np.array_equal(transition.composite(INCOMING, 2.0), INCOMING)
+
+
+@pytest.mark.parametrize("name", TRANSITIONS)
+def test_composite_reuses_its_buffer(name: str):
+    transition = TRANSITIONS[name](OUTGOING.copy(), 0.5)
+    assert transition.composite(INCOMING, 0.25) is transition.composite(INCOMING, 0.75)
+
+
+def test_crossfade_halfway():
+    result = Crossfade(OUTGOING.copy(), 0.5).composite(INCOMING, 0.5)
+    assert np.array_equal(result, (OUTGOING.astype(np.uint16) + INCOMING) // 2)
+
+
+def test_slide_halfway():
+    result = Slide(OUTGOING.copy(), 0.5).composite(INCOMING, 0.5)
+    assert np.array_equal(result[:, :4], OUTGOING[:, 4:])
+    assert np.array_equal(result[:, 4:], INCOMING[:, :4])
+
+
+def test_wipe_halfway():
+    result = Wipe(OUTGOING.copy(), 0.5).composite(INCOMING, 0.5)
+    assert np.array_equal(result[:, :4], INCOMING[:, :4])
+    assert np.array_equal(result[:, 4:], OUTGOING[:, 4:])